@@ -40,30 +40,37 @@ HOW COMPACT WORKS
 from __future__ import annotations
 
 import argparse
+import atexit
+import fcntl
+import functools
+import io
 import os
+import queue
 import re
 import shlex
+import shutil
 import subprocess
 import sys
+import tempfile
+import threading
 from dataclasses import dataclass, field
-from typing import Protocol, runtime_checkable
-
-import yaml
+from typing import Iterator, Protocol, runtime_checkable
 
 # ============================================================
 # MODELS
 # ============================================================
 
 
-@dataclass(frozen=True, order=True)
+@dataclass(frozen=True, order=True, slots=True)
 class Snapshot:
     """A ZFS snapshot: pool/dataset@name."""
     dataset: str
     name: str  # just the snapshot name after '@'
+    # Built once: compaction matches and dedupes on it for every snapshot.
+    full_name: str = field(init=False, repr=False, compare=False)
 
-    @property
-    def full_name(self) -> str:
-        return f"{self.dataset}@{self.name}"
+    def __post_init__(self) -> None:
+        object.__setattr__(self, "full_name", f"{self.dataset}@{self.name}")
 
     @classmethod
     def parse(cls, full_name: str) -> "Snapshot":
@@ -73,6 +80,12 @@ class Snapshot:
         return cls(dataset=dataset, name=name)
 
 
+@functools.lru_cache(maxsize=1024)
+def _compile_pattern(pattern: str) -> re.Pattern[str]:
+    """re.compile with a cache that outlives re's own (which holds 512 entries)."""
+    return re.compile(pattern)
+
+
 @dataclass
 class RetentionRule:
     """Keep the N most recent snapshots matching a pattern.
@@ -83,14 +96,24 @@ class RetentionRule:
     """
     pattern: str
     keep: int
+    regex: re.Pattern[str] = field(init=False, repr=False, compare=False)
+
+    def __post_init__(self) -> None:
+        self.regex = _compile_pattern(self.pattern)
 
     def matches(self, snapshot_name: str) -> bool:
-        return bool(re.fullmatch(self.pattern, snapshot_name))
+        return bool(self.regex.fullmatch(snapshot_name))
 
 
 @dataclass
 class SourceConfig:
     pool: str
+    # Send raw (-w) instead of compressed (-c): required to replicate encrypted
+    # datasets without decrypting them; implies large blocks and embedded data.
+    raw: bool = False
+    # Add -L -e to non-raw sends: keep >128K records whole and send embedded
+    # blocks as-is. Must match how the destination was bootstrapped.
+    large_blocks: bool = False
 
 
 @dataclass
@@ -100,6 +123,8 @@ class DestinationConfig:
     host: str | None = None
     user: str | None = None
     port: int = 22
+    # In-memory buffer between zfs send and zfs recv, in MiB (0 = direct pipe)
+    buffer_mb: int = 0
 
     @property
     def is_remote(self) -> bool:
@@ -119,6 +144,8 @@ class JobConfig:
     destination: DestinationConfig
     datasets: list[str]
     compaction: list[RetentionRule] = field(default_factory=list)
+    # Datasets transferred concurrently during backup (1 = one at a time)
+    max_parallel: int = 1
 
 
 # ============================================================
@@ -148,11 +175,46 @@ class Executor(Protocol):
         """Run a command, return stdout. Raise ExecutorError on failure."""
         raise NotImplementedError
 
+    def iter_lines(self, cmd: list[str]) -> Iterator[str]:
+        """Run a command, yielding stdout lines as they arrive.
+
+        Raises ExecutorError once the output is exhausted if the command failed.
+        """
+        raise NotImplementedError
+
     def popen(self, cmd: list[str], **kwargs) -> subprocess.Popen:
         """Launch a command as a Popen object for piping."""
         raise NotImplementedError
 
 
+def _iter_captured_lines(cmd: list[str]) -> Iterator[str]:
+    """Yield cmd's stdout line by line; raise ExecutorError at the end on failure.
+
+    Lets large zfs list output be parsed while zfs is still producing it,
+    without holding all of it in memory. stderr is read after stdout closes;
+    zfs only writes a line or two there, well below the pipe buffer.
+    """
+    with subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE) as proc:
+        for line in proc.stdout:
+            yield line.decode()
+        stderr = proc.stderr.read()
+    if proc.returncode != 0:
+        raise ExecutorError(cmd, proc.returncode, stderr.decode(errors="replace"))
+
+
+def _run_captured(cmd: list[str]) -> str:
+    """Run cmd to completion and return its stdout; raise ExecutorError on failure.
+
+    Output is captured as bytes and decoded in one call rather than with
+    text=True, which also runs universal-newline translation over all of it
+    (zfs list output can be many MB). zfs prints '\n' only.
+    """
+    result = subprocess.run(cmd, capture_output=True, check=False)
+    if result.returncode != 0:
+        raise ExecutorError(cmd, result.returncode, result.stderr.decode(errors="replace"))
+    return result.stdout.decode()
+
+
 class LocalExecutor:
     """Run commands on the local machine."""
 
@@ -161,44 +223,114 @@ class LocalExecutor:
         return "local"
 
     def run(self, cmd: list[str]) -> str:
-        result = subprocess.run(cmd, capture_output=True, text=True, check=False)
-        if result.returncode != 0:
-            raise ExecutorError(cmd, result.returncode, result.stderr)
-        return result.stdout
+        return _run_captured(cmd)
+
+    def iter_lines(self, cmd: list[str]) -> Iterator[str]:
+        return _iter_captured_lines(cmd)
 
     def popen(self, cmd: list[str], **kwargs) -> subprocess.Popen:
         return subprocess.Popen(cmd, text=False, **kwargs)
 
 
+# Short commands open at once over the shared SSH master connection. Kept
+# below sshd's default MaxSessions (10), above which sessions are refused.
+SSH_MAX_SESSIONS = 8
+
+
 class SSHExecutor:
-    """Run commands on a remote host via SSH."""
+    """Run commands on a remote host via SSH.
+
+    Short commands (run, iter_lines) share one multiplexed connection
+    (OpenSSH ControlMaster), so a job pays for the TCP and key exchange
+    handshake once rather than once per zfs list/get/destroy. At most
+    SSH_MAX_SESSIONS of them run at a time; parallel backups with a larger
+    max_parallel wait for a free session. Transfer streams (popen) get a
+    dedicated connection: the master would otherwise encrypt every parallel
+    transfer on a single core.
+    """
 
     def __init__(self, host: str, user: str | None = None, port: int = 22):
         self.host = host
         self.user = user
         self.port = port
+        self._control_dir: str | None = None
+        self._master_lock = threading.Lock()
+        self._sessions = threading.BoundedSemaphore(SSH_MAX_SESSIONS)
 
     @property
     def label(self) -> str:
         dest = f"{self.user}@{self.host}" if self.user else self.host
         return f"ssh://{dest}:{self.port}"
 
-    def _ssh_prefix(self) -> list[str]:
+    def _control_path(self) -> str:
+        if self._control_dir is None:
+            self._control_dir = tempfile.mkdtemp(prefix="mzb-ssh-")
+            atexit.register(self.close)
+        return os.path.join(self._control_dir, "%C")
+
+    def _ssh_prefix(self, control: str | None = None) -> list[str]:
+        """ssh argv up to the destination; control is the ControlMaster mode, if any."""
         dest = f"{self.user}@{self.host}" if self.user else self.host
+        mux = [
+            "-o", f"ControlMaster={control}",
+            "-o", f"ControlPath={self._control_path()}",
+        ] if control else []
         return [
             "ssh",
             "-o", "BatchMode=yes",
             "-o", "StrictHostKeyChecking=accept-new",
+            *mux,
             "-p", str(self.port),
             dest,
         ]
 
+    def _start_master(self) -> None:
+        """Start the shared master connection once, before the first short command.
+
+        Started on its own with all stdio on /dev/null: a master spawned by a
+        captured command (ControlMaster=auto) can keep that command's stderr
+        pipe open in the background on older OpenSSH, and the capture would
+        then wait for the master to exit. -f returns once authenticated, so
+        the socket exists when this returns. If the master fails to start,
+        short commands still connect directly (ControlMaster=no falls back
+        when the socket is missing) and report the real error themselves.
+
+        The master exits after ControlPersist seconds without a short command
+        (e.g. during a long transfer, which has its own connection), removing
+        its socket; the next short command then starts a new one.
+        """
+        with self._master_lock:
+            if self._control_dir is not None and os.listdir(self._control_dir):
+                return
+            cmd = self._ssh_prefix(control="yes")
+            # Bounded so a master left behind by a killed mzb expires on its own
+            cmd[-1:-1] = ["-o", "ControlPersist=60", "-N", "-f"]
+            subprocess.run(
+                cmd, stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL,
+                stderr=subprocess.DEVNULL, check=False,
+            )
+
+    def _short_command(self, cmd: list[str]) -> list[str]:
+        self._start_master()
+        return self._ssh_prefix(control="no") + [shlex.join(cmd)]
+
+    def close(self) -> None:
+        """Stop the shared master connection, if one was started."""
+        if self._control_dir is None:
+            return
+        cmd = self._ssh_prefix(control="no")
+        cmd[-1:-1] = ["-O", "exit"]  # control command goes before the destination
+        subprocess.run(cmd, capture_output=True, check=False)
+        shutil.rmtree(self._control_dir, ignore_errors=True)
+        self._control_dir = None
+
     def run(self, cmd: list[str]) -> str:
-        full_cmd = self._ssh_prefix() + [shlex.join(cmd)]
-        result = subprocess.run(full_cmd, capture_output=True, text=True, check=False)
-        if result.returncode != 0:
-            raise ExecutorError(full_cmd, result.returncode, result.stderr)
-        return result.stdout
+        with self._sessions:
+            return _run_captured(self._short_command(cmd))
+
+    def iter_lines(self, cmd: list[str]) -> Iterator[str]:
+        with self._sessions:  # held until the output is consumed
+            yield from _iter_captured_lines(self._short_command(cmd))
 
     def popen(self, cmd: list[str], **kwargs) -> subprocess.Popen:
         full_cmd = self._ssh_prefix() + [shlex.join(cmd)]
@@ -214,10 +346,19 @@ class ConfigError(Exception):
     pass
 
 
+def _read_yaml(path: str):
+    # Imported here rather than at the top: yaml is the slowest import mzb has
+    # and is only needed once per run, so --help never pays for it.
+    import yaml
+    # libyaml's C parser when PyYAML was built with it; same safe subset
+    loader = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+    with open(path, encoding="utf-8") as f:
+        return yaml.load(f, Loader=loader)
+
+
 def load_source_pool(path: str) -> str:
     """Load only the source pool name from a config file (for discover)."""
-    with open(path, encoding="utf-8") as f:
-        raw = yaml.safe_load(f)
+    raw = _read_yaml(path)
     if not isinstance(raw, dict):
         raise ConfigError(f"Config must be a YAML mapping: {path}")
     src_raw = raw.get("source")
@@ -227,8 +368,7 @@ def load_source_pool(path: str) -> str:
 
 
 def load_job(path: str) -> JobConfig:
-    with open(path, encoding="utf-8") as f:
-        raw = yaml.safe_load(f)
+    raw = _read_yaml(path)
 
     if not isinstance(raw, dict):
         raise ConfigError(f"Config must be a YAML mapping: {path}")
@@ -237,7 +377,13 @@ def load_job(path: str) -> JobConfig:
     src_raw = raw.get("source")
     if not src_raw or not src_raw.get("pool"):
         raise ConfigError("source.pool is required")
-    source = SourceConfig(pool=src_raw["pool"])
+    raw_send = src_raw.get("raw", False)
+    if not isinstance(raw_send, bool):
+        raise ConfigError(f"source.raw must be true or false, got {raw_send!r}")
+    large_blocks = src_raw.get("large_blocks", False)
+    if not isinstance(large_blocks, bool):
+        raise ConfigError(f"source.large_blocks must be true or false, got {large_blocks!r}")
+    source = SourceConfig(pool=src_raw["pool"], raw=raw_send, large_blocks=large_blocks)
 
     # --- destination ---
     dst_raw = raw.get("destination")
@@ -252,7 +398,10 @@ def load_job(path: str) -> JobConfig:
         host=dst_raw.get("host"),
         user=dst_raw.get("user"),
         port=int(dst_raw.get("port", 22)),
+        buffer_mb=int(dst_raw.get("buffer_mb", 0)),
     )
+    if destination.buffer_mb < 0:
+        raise ConfigError(f"destination.buffer_mb must be >= 0, got {destination.buffer_mb}")
 
     # --- datasets ---
     datasets_raw = raw.get("datasets", [])
@@ -275,16 +424,21 @@ def load_job(path: str) -> JobConfig:
             raise ConfigError(f"Compaction rule 'keep' must be >= 0, got {keep}")
         pattern = rule["pattern"]
         try:
-            re.compile(pattern)
+            compaction.append(RetentionRule(pattern=pattern, keep=keep))
         except re.error as e:
             raise ConfigError(f"Invalid regex in compaction pattern {pattern!r}: {e}") from e
-        compaction.append(RetentionRule(pattern=pattern, keep=keep))
+
+    # --- parallelism ---
+    max_parallel = int(raw.get("max_parallel", 1))
+    if max_parallel < 1:
+        raise ConfigError(f"max_parallel must be >= 1, got {max_parallel}")
 
     return JobConfig(
         source=source,
         destination=destination,
         datasets=datasets,
         compaction=compaction,
+        max_parallel=max_parallel,
     )
 
 
@@ -293,69 +447,294 @@ def load_job(path: str) -> JobConfig:
 # ============================================================
 
 
-def list_datasets(pool: str, executor: "Executor") -> list[str]:
-    """Return all dataset names in a pool (excluding the pool root itself)."""
-    output = executor.run(["zfs", "list", "-H", "-o", "name", "-r", pool])
-    return [
-        line.strip()
-        for line in output.splitlines()
-        if line.strip() and line.strip() != pool
-    ]
+def list_snapshots(dataset: str, executor: "Executor") -> list[Snapshot]:
+    """Return snapshots for a dataset, oldest first.
 
+    The dataset itself is listed alongside its snapshots, so the call fails
+    (ExecutorError) when the dataset does not exist; see list_snapshots_if_exists.
+    -d 1 stops zfs at the direct children: their snapshots are never walked.
 
-def list_snapshots(dataset: str, executor: "Executor") -> list[Snapshot]:
-    """Return snapshots for a dataset, oldest first."""
-    output = executor.run([
-        "zfs", "list", "-H", "-o", "name", "-t", "snapshot", "-r", dataset,
+    "Oldest first" is zfs list's default creation order. Don't add -s name:
+    names from different schedules (backup10t-push-*, zfs-auto-snap_*) do not
+    sort chronologically, and planning and compaction depend on this order.
+    """
+    lines = executor.iter_lines([
+        "zfs", "list", "-H", "-o", "name", "-t", "filesystem,volume,snapshot", "-d", "1", dataset,
     ])
     results = []
-    for line in output.splitlines():
-        name = line.strip()
-        if not name:
-            continue
+    for line in lines:
+        ds, _, name = line.strip().partition("@")
         # Only include snapshots directly on this dataset (not children)
-        if "@" in name and name.split("@")[0] == dataset:
-            results.append(Snapshot.parse(name))
+        if name and ds == dataset:
+            results.append(Snapshot(dataset=ds, name=name))
     return results
 
 
-def dataset_exists(dataset: str, executor: "Executor") -> bool:
-    """Return True if the dataset exists."""
+def get_resume_token(dataset: str, executor: "Executor") -> str | None:
+    """Return the receive_resume_token left by an interrupted 'zfs recv -s', or None."""
+    output = executor.run([
+        "zfs", "get", "-H", "-o", "value", "receive_resume_token", dataset,
+    ]).strip()
+    return None if output in ("", "-") else output
+
+
+def get_resume_tokens(datasets: list[str], executor: "Executor") -> dict[str, str]:
+    """Return {dataset: receive_resume_token} for those datasets that have one.
+
+    One zfs get covers every dataset; all of them must exist.
+    """
+    if not datasets:
+        return {}
+    output = executor.run([
+        "zfs", "get", "-H", "-o", "name,value", "receive_resume_token", *datasets,
+    ])
+    tokens = {}
+    for line in io.StringIO(output):
+        name, _, value = line.rstrip("\n").partition("\t")
+        if value not in ("", "-"):
+            tokens[name] = value
+    return tokens
+
+
+def list_snapshots_if_exists(dataset: str, executor: "Executor") -> list[Snapshot] | None:
+    """Return snapshots for a dataset (oldest first), or None if it does not exist.
+
+    Answers both questions with one zfs call instead of an existence check + list_snapshots.
+    """
     try:
-        executor.run(["zfs", "list", "-H", "-o", "name", dataset])
-        return True
+        return list_snapshots(dataset, executor)
     except ExecutorError:
-        return False
+        return None
 
 
-def get_auto_snapshot_property(dataset: str, executor: "Executor") -> bool:
-    """Return the effective value of com.sun:auto-snapshot for a dataset."""
+def list_snapshots_of(datasets: list[str], executor: "Executor") -> dict[str, list[Snapshot]]:
+    """Return {dataset: snapshots oldest first} for several datasets in one zfs list.
+
+    Only the named datasets are walked (-d 1 each), however unrelated the rest
+    of the pool is. Raises ExecutorError if any of them does not exist.
+    """
+    results: dict[str, list[Snapshot]] = {}
+    wanted = set(datasets)
+    lines = executor.iter_lines([
+        "zfs", "list", "-H", "-o", "name", "-t", "filesystem,volume,snapshot", "-d", "1", *datasets,
+    ])
+    for line in lines:
+        ds, _, name = line.strip().partition("@")
+        # Skips unconfigured direct children, which -d 1 lists too
+        if ds not in wanted:
+            continue
+        snaps = results.setdefault(ds, [])
+        if name:
+            snaps.append(Snapshot(dataset=ds, name=name))
+    return results
+
+
+# Concurrent per-dataset listings when they can't be batched. More would
+# only queue for a session over SSH (see SSH_MAX_SESSIONS).
+LIST_WORKERS = SSH_MAX_SESSIONS
+
+
+def snapshots_by_dataset(
+    datasets: list[str], executor: "Executor",
+) -> dict[str, list[Snapshot] | None]:
+    """Return list_snapshots_if_exists for each dataset, batching where possible.
+
+    All datasets are listed with a single zfs list (one process / SSH round
+    trip instead of one per dataset). If that fails because any of them does
+    not exist (e.g. not bootstrapped yet), each dataset is listed on its own,
+    up to LIST_WORKERS at a time, to tell which.
+    """
+    if len(datasets) <= 1:
+        return {ds: list_snapshots_if_exists(ds, executor) for ds in datasets}
     try:
-        output = executor.run([
-            "zfs", "get", "-H", "-o", "value", "com.sun:auto-snapshot", dataset,
-        ])
-        return output.strip() == "true"
+        listed = list_snapshots_of(datasets, executor)
     except ExecutorError:
-        return False
+        pass
+    else:
+        return {ds: listed.get(ds) for ds in datasets}
+
+    import concurrent.futures
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=min(LIST_WORKERS, len(datasets))) as pool:
+        results = pool.map(lambda ds: list_snapshots_if_exists(ds, executor), datasets)
+        return dict(zip(datasets, results))
+
+
+def snapshots_by_dataset_both(
+    src_datasets: list[str],
+    src_executor: "Executor",
+    dst_datasets: list[str],
+    dst_executor: "Executor",
+) -> tuple[dict[str, list[Snapshot] | None], dict[str, list[Snapshot] | None]]:
+    """snapshots_by_dataset for source and destination, listed concurrently.
+
+    Both calls mostly wait on zfs (and on SSH for a remote destination), so
+    the source listing runs in a worker thread while the destination's runs here.
+    """
+    import concurrent.futures
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=1) as pool:
+        src_future = pool.submit(snapshots_by_dataset, src_datasets, src_executor)
+        dst_listed = snapshots_by_dataset(dst_datasets, dst_executor)
+        return src_future.result(), dst_listed
+
+
+def resume_tokens_by_dataset(
+    datasets: list[str], executor: "Executor",
+) -> tuple[dict[str, str], dict[str, ExecutorError]]:
+    """Return get_resume_tokens for datasets, plus {dataset: error} for any that failed.
+
+    All datasets are read with a single zfs get. If that fails (e.g. one was
+    destroyed since it was listed), each dataset is read on its own, up to
+    LIST_WORKERS at a time, so only the failing ones are reported.
+    """
+    try:
+        return get_resume_tokens(datasets, executor), {}
+    except ExecutorError:
+        pass
+
+    def one(ds: str) -> str | ExecutorError | None:
+        try:
+            return get_resume_token(ds, executor)
+        except ExecutorError as e:
+            return e
+
+    import concurrent.futures
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=min(LIST_WORKERS, len(datasets))) as pool:
+        results = dict(zip(datasets, pool.map(one, datasets)))
+    tokens = {ds: r for ds, r in results.items() if isinstance(r, str)}
+    errors = {ds: r for ds, r in results.items() if isinstance(r, ExecutorError)}
+    return tokens, errors
 
 
 def discover_datasets(pool: str, executor: "Executor") -> list[str]:
-    """Return dataset names in pool where com.sun:auto-snapshot is effectively true."""
-    return [
-        ds for ds in list_datasets(pool, executor)
-        if get_auto_snapshot_property(ds, executor)
-    ]
+    """Return dataset names in pool where com.sun:auto-snapshot is effectively true.
+
+    One recursive zfs get reads the (inherited) property of every dataset,
+    instead of listing the pool and then reading the property per dataset.
+    """
+    output = executor.run([
+        "zfs", "get", "-H", "-r", "-t", "filesystem,volume", "-o", "name,value",
+        "com.sun:auto-snapshot", pool,
+    ])
+    datasets = []
+    for line in io.StringIO(output):
+        name, _, value = line.rstrip("\n").partition("\t")
+        if name and name != pool and value == "true":
+            datasets.append(name)
+    return datasets
 
 
-def find_common_snapshot(src_snaps: list[Snapshot],dst_snaps: list[Snapshot], ) -> Snapshot | None:
-    """Return the most recent snapshot present in both lists, or None."""
-    dst_names = {s.name for s in dst_snaps}
-    for snap in reversed(src_snaps):  # newest first
-        if snap.name in dst_names:
-            return snap
+def find_common_indices(
+    src_snaps: list[Snapshot],
+    dst_snaps: list[Snapshot],
+) -> tuple[int, int] | None:
+    """Return (src index, dst index) of the most recent common snapshot, or None.
+
+    Builds one name -> index map of dst and walks src newest first, so callers
+    get both positions without rescanning either list.
+    """
+    # Fast path for up-to-date datasets: both newest snapshots are the same.
+    # Names are unique within a dataset, so no later common snapshot exists.
+    if src_snaps and dst_snaps and src_snaps[-1].name == dst_snaps[-1].name:
+        return len(src_snaps) - 1, len(dst_snaps) - 1
+    dst_index = {s.name: i for i, s in enumerate(dst_snaps)}
+    for src_idx in range(len(src_snaps) - 1, -1, -1):  # newest first
+        dst_idx = dst_index.get(src_snaps[src_idx].name)
+        if dst_idx is not None:
+            return src_idx, dst_idx
     return None
 
 
+def find_common_snapshot(src_snaps: list[Snapshot], dst_snaps: list[Snapshot]) -> Snapshot | None:
+    """Return the most recent snapshot present in both lists, or None."""
+    found = find_common_indices(src_snaps, dst_snaps)
+    return src_snaps[found[0]] if found else None
+
+
+# Read size for the send/recv buffer pump (same block size mbuffer defaults to)
+_PUMP_CHUNK = 128 * 1024
+
+# Capacity requested for send/recv pipes. Linux defaults to 64 KiB; 1 MiB is
+# the most an unprivileged process may ask for (fs.pipe-max-size).
+_PIPE_SIZE = 1024 * 1024
+
+
+def _grow_pipe(stream) -> None:
+    """Best effort: enlarge the pipe behind stream to _PIPE_SIZE (Linux only).
+
+    A larger pipe means fewer wakeups of zfs send and zfs recv per byte moved.
+    Kept at the default where unsupported or refused (e.g. the per-user pipe
+    memory limit is exhausted).
+    """
+    set_size = getattr(fcntl, "F_SETPIPE_SZ", None)
+    if set_size is None:
+        return
+    try:
+        fcntl.fcntl(stream.fileno(), set_size, _PIPE_SIZE)
+    except OSError:
+        pass
+
+
+def _write_all(fd: int, data: bytes) -> None:
+    view = memoryview(data)
+    while view:
+        view = view[os.write(fd, view):]
+
+
+def _buffered_copy(src_fd: int, dst_fd: int, buffer_size: int) -> None:
+    """
+    Copy src_fd to dst_fd through an in-memory buffer of up to buffer_size bytes.
+
+    A reader thread keeps draining src_fd while the calling thread writes to
+    dst_fd, so a momentary stall on one side (e.g. recv committing a txg, or
+    the network) does not immediately stall the other. Returns at EOF on
+    src_fd. If a write to dst_fd fails (recv died), the reader is told to
+    stop and whatever it still queues is discarded; the function returns
+    once the reader has exited after its current read. The caller closes
+    both fds and checks exit codes.
+    """
+    chunks: queue.Queue[bytes | None] = queue.Queue(maxsize=max(1, buffer_size // _PUMP_CHUNK))
+    stop = threading.Event()
+
+    def reader() -> None:
+        try:
+            while not stop.is_set():
+                chunk = os.read(src_fd, _PUMP_CHUNK)
+                if not chunk:
+                    break
+                chunks.put(chunk)
+        except OSError:
+            pass
+        finally:
+            chunks.put(None)
+
+    thread = threading.Thread(target=reader, name="mzb-send-buffer", daemon=True)
+    thread.start()
+    failed = False
+    while (chunk := chunks.get()) is not None:
+        if failed:
+            continue  # drain so the reader can observe stop and exit
+        try:
+            _write_all(dst_fd, chunk)
+        except OSError:
+            failed = True
+            stop.set()
+    thread.join()
+
+
+def send_flags(raw: bool = False, large_blocks: bool = False) -> list[str]:
+    """Return the zfs send flags controlling the stream format.
+
+    Raw sends already carry large and embedded blocks as stored, so
+    large_blocks only changes non-raw streams.
+    """
+    if raw:
+        return ["-w"]
+    return ["-L", "-e", "-c"] if large_blocks else ["-c"]
+
+
 def send_incremental(
     common: Snapshot,
     latest: Snapshot,
@@ -364,22 +743,79 @@ def send_incremental(
     dst_dataset: str,
     dry_run: bool = False,
     verbose: bool = False,
+    buffer_size: int = 0,
+    raw: bool = False,
+    large_blocks: bool = False,
 ) -> None:
     """
     Send all snapshots from common (exclusive) to latest (inclusive) to dst_dataset.
 
-    Uses: zfs send -c -I pool/dataset@common pool/dataset@latest | [ssh] zfs recv dst_dataset
+    Uses: zfs send -c -I pool/dataset@common pool/dataset@latest | [ssh] zfs recv -s dst_dataset
 
     The -c (--compressed) flag sends blocks in their on-disk compressed form,
     avoiding a needless decompress/recompress cycle and reducing bytes over the
     wire when the source dataset has compression enabled.  It is a safe no-op
     when the source dataset is uncompressed.
+
+    With raw=True, -w (--raw) is sent instead: blocks go exactly as stored on
+    disk, so encrypted datasets replicate without being decrypted (and -c is
+    implied).
+
+    With large_blocks=True, -L -e are added: records larger than 128K are sent
+    whole instead of split, and embedded (tiny, inline) blocks are sent as-is.
+    The receiver rejects an incremental whose -L differs from the stream that
+    created the dataset, so this must match the bootstrap send.
+
+    recv -s keeps the partially received state if the transfer is interrupted,
+    so the next run can pick up where it left off (see send_resume).
+
+    If buffer_size > 0, the stream is relayed through an in-process buffer of
+    that many bytes (see _buffered_copy) instead of a direct kernel pipe, which
+    smooths out bursty send/recv without needing mbuffer on either host.
     """
-    send_cmd = ["zfs", "send", "-c", "-I", common.full_name, latest.full_name]
-    recv_cmd = ["zfs", "recv", dst_dataset]
+    send_cmd = [
+        "zfs", "send", *send_flags(raw, large_blocks), "-I", common.full_name, latest.full_name,
+    ]
+    recv_cmd = ["zfs", "recv", "-s", dst_dataset]
+    _send_recv(send_cmd, recv_cmd, src_executor, dst_executor, dry_run, verbose, buffer_size)
 
+
+def send_resume(
+    token: str,
+    src_executor: "Executor",
+    dst_executor: "Executor",
+    dst_dataset: str,
+    dry_run: bool = False,
+    verbose: bool = False,
+    buffer_size: int = 0,
+) -> None:
+    """
+    Finish an interrupted receive into dst_dataset from where it stopped.
+
+    Uses: zfs send -t <receive_resume_token> | [ssh] zfs recv -s dst_dataset
+
+    The token records the snapshot, flags and byte offset of the interrupted
+    stream, so only the remaining data is sent.
+    """
+    send_cmd = ["zfs", "send", "-t", token]
+    recv_cmd = ["zfs", "recv", "-s", dst_dataset]
+    _send_recv(send_cmd, recv_cmd, src_executor, dst_executor, dry_run, verbose, buffer_size)
+
+
+def _send_recv(
+    send_cmd: list[str],
+    recv_cmd: list[str],
+    src_executor: "Executor",
+    dst_executor: "Executor",
+    dry_run: bool,
+    verbose: bool,
+    buffer_size: int,
+) -> None:
+    """Run send_cmd | recv_cmd across the two executors. Raise ExecutorError on failure."""
     if dry_run or verbose:
         print(f"  [send] {shlex.join(send_cmd)}")
+        if buffer_size:
+            print(f"  [buffer] {buffer_size // (1024 * 1024)} MiB")
         print(f"  [recv ({dst_executor.label})] {shlex.join(recv_cmd)}")
 
     if dry_run:
@@ -389,14 +825,26 @@ def send_incremental(
         send_proc = src_executor.popen(send_cmd, stdout=subprocess.PIPE)
     except OSError as e:
         raise ExecutorError(send_cmd, 1, str(e)) from e
+    _grow_pipe(send_proc.stdout)
     try:
-        recv_proc = dst_executor.popen(recv_cmd, stdin=send_proc.stdout)
+        recv_proc = dst_executor.popen(
+            recv_cmd, stdin=subprocess.PIPE if buffer_size else send_proc.stdout,
+        )
     except OSError as e:
         send_proc.kill()
         send_proc.wait()
         raise ExecutorError(recv_cmd, 1, str(e)) from e
-    # Allow send_proc to receive SIGPIPE if recv_proc dies
-    send_proc.stdout.close()
+    if buffer_size:
+        _grow_pipe(recv_proc.stdin)
+        try:
+            _buffered_copy(send_proc.stdout.fileno(), recv_proc.stdin.fileno(), buffer_size)
+        finally:
+            # EOF for recv_proc; SIGPIPE for send_proc if we stopped early
+            recv_proc.stdin.close()
+            send_proc.stdout.close()
+    else:
+        # Allow send_proc to receive SIGPIPE if recv_proc dies
+        send_proc.stdout.close()
 
     recv_rc = recv_proc.wait()
     send_rc = send_proc.wait()
@@ -424,6 +872,59 @@ def destroy_snapshot(
     executor.run(cmd)
 
 
+# Upper bound on snapshots per batched destroy, keeping the command line well
+# under ARG_MAX (and the remote shell's limits when going over SSH).
+DESTROY_BATCH_SIZE = 1000
+# Upper bound on the length of the batched "dataset@a,b,..." argument. Linux
+# caps a single argv string at 128 KiB (MAX_ARG_STRLEN) regardless of ARG_MAX,
+# and long snapshot names could hit that before DESTROY_BATCH_SIZE does.
+DESTROY_BATCH_BYTES = 64 * 1024
+
+
+def destroy_batches(snapshots: list[Snapshot]) -> list[list[Snapshot]]:
+    """Split snapshots (of one dataset) into batches for destroy_snapshots."""
+    batches: list[list[Snapshot]] = []
+    batch: list[Snapshot] = []
+    length = 0
+    for snap in snapshots:
+        if batch and (len(batch) >= DESTROY_BATCH_SIZE
+                      or length + len(snap.name) + 1 > DESTROY_BATCH_BYTES):
+            batches.append(batch)
+            batch, length = [], 0
+        if not batch:
+            length = len(snap.dataset) + 1
+        batch.append(snap)
+        length += len(snap.name) + 1
+    if batch:
+        batches.append(batch)
+    return batches
+
+
+def destroy_snapshots(
+    snapshots: list[Snapshot],
+    executor: "Executor",
+    dry_run: bool = False,
+    verbose: bool = False,
+) -> None:
+    """
+    Destroy several snapshots of one dataset in a single command.
+
+    Uses: zfs destroy pool/dataset@snap1,snap2,...
+
+    ZFS destroys the batch atomically: if any snapshot cannot be destroyed
+    (e.g. it is held or busy), none of them are.
+    """
+    datasets = {s.dataset for s in snapshots}
+    if len(datasets) != 1:
+        raise ValueError(f"Batched destroy needs snapshots of exactly one dataset, got {sorted(datasets)}")
+    cmd = ["zfs", "destroy", f"{snapshots[0].dataset}@" + ",".join(s.name for s in snapshots)]
+    if dry_run or verbose:
+        print(f"  [destroy] {shlex.join(cmd)}")
+    if dry_run:
+        return
+    executor.run(cmd)
+
+
 # ============================================================
 # BACKUP
 # ============================================================
@@ -438,6 +939,12 @@ else:
     RESET = "\033[0m"
 
 
+def _write_lines(lines: list[str], stream=None) -> None:
+    """Write lines, each newline-terminated, to stream (default stdout) in one call."""
+    if lines:
+        (stream or sys.stdout).write("\n".join(lines) + "\n")
+
+
 def _confirm(prompt: str) -> bool:
     """Ask the user yes/no. Return True if yes."""
     try:
@@ -453,16 +960,21 @@ def _format_bootstrap_command(
     first_snap: str,
     dst_executor: "Executor",
     dst_dataset: str,
+    raw: bool = False,
+    large_blocks: bool = False,
 ) -> str:
     """Return the bootstrap command string for a dataset with no common snapshot."""
     recv_cmd = shlex.join(["zfs", "recv", "-F", dst_dataset])
+    send_cmd = shlex.join([
+        "zfs", "send", *send_flags(raw, large_blocks), f"{src_dataset}@{first_snap}",
+    ])
     label = dst_executor.label
     if label.startswith("ssh://"):
         # Extract user@host from ssh://user@host:port
         dest = label[len("ssh://"):].rsplit(":", 1)[0]
-        return f"zfs send -c {src_dataset}@{first_snap} | ssh {dest} {recv_cmd}"
+        return f"{send_cmd} | ssh {dest} {recv_cmd}"
 
-    return f"zfs send -c {src_dataset}@{first_snap} | {recv_cmd}"
+    return f"{send_cmd} | {recv_cmd}"
 
 
 @dataclass
@@ -470,8 +982,10 @@ class _DatasetPlan:
     """Plan for a single dataset within a backup job."""
     src_dataset: str
     dst_dataset: str
-    # One of: "send", "up_to_date", "rollback_and_send", "rollback_only", "error", "skip"
+    # One of: "send", "up_to_date", "rollback_and_send", "rollback_only", "resume", "error", "skip"
     action: str = "skip"
+    # For resume: token of an interrupted 'zfs recv -s' on the destination
+    resume_token: str = ""
     # For send / rollback_and_send
     common: Snapshot | None = None
     latest: Snapshot | None = None
@@ -484,33 +998,80 @@ class _DatasetPlan:
     bootstrap_cmd: str = ""
 
 
-def _plan_dataset(
+@dataclass
+class _Listings:
+    """Everything planning needs from zfs, fetched up front for all datasets."""
+    src: dict[str, list[Snapshot] | None]
+    dst: dict[str, list[Snapshot] | None]
+    resume_tokens: dict[str, str]
+    # Destination datasets whose resume token could not be read
+    resume_errors: dict[str, ExecutorError] = field(default_factory=dict)
+
+
+def _fetch_listings(
+    src_datasets: list[str],
+    src_executor: "Executor",
+    dst_datasets: list[str],
+    dst_executor: "Executor",
+) -> _Listings:
+    src, dst = snapshots_by_dataset_both(src_datasets, src_executor, dst_datasets, dst_executor)
+    # Only pairs that exist on both sides get as far as the resume check
+    checked = [d for s, d in zip(src_datasets, dst_datasets) if src[s] is not None and dst[d] is not None]
+    tokens, errors = resume_tokens_by_dataset(checked, dst_executor)
+    return _Listings(src=src, dst=dst, resume_tokens=tokens, resume_errors=errors)
+
+
+def _plan_dataset(  # pylint: disable=too-many-return-statements
     src_dataset: str,
     dst_dataset: str,
     src_executor: "Executor",
     dst_executor: "Executor",
     verbose: bool = False,
+    raw: bool = False,
+    large_blocks: bool = False,
+    listed: _Listings | None = None,
 ) -> _DatasetPlan:
-    """Analyze a dataset pair and return a plan for what to do."""
+    """Analyze a dataset pair and return a plan for what to do.
+
+    listed: _fetch_listings result covering this pair; when omitted both
+    sides are queried here.
+    """
     plan = _DatasetPlan(src_dataset=src_dataset, dst_dataset=dst_dataset)
 
-    if not dataset_exists(src_dataset, src_executor):
+    if listed is None:
+        src_snaps = list_snapshots_if_exists(src_dataset, src_executor)
+        dst_snaps = list_snapshots_if_exists(dst_dataset, dst_executor)
+    else:
+        src_snaps, dst_snaps = listed.src[src_dataset], listed.dst[dst_dataset]
+
+    if src_snaps is None:
         plan.action = "error"
         plan.message = f"Source dataset does not exist: {src_dataset}"
         return plan
 
-    if not dataset_exists(dst_dataset, dst_executor):
+    if dst_snaps is None:
         plan.action = "error"
         plan.message = f"Destination dataset does not exist: {dst_dataset}"
-        src_snaps = list_snapshots(src_dataset, src_executor)
         if src_snaps:
             plan.bootstrap_cmd = _format_bootstrap_command(
-                src_dataset, src_snaps[0].name, dst_executor, dst_dataset
+                src_dataset, src_snaps[0].name, dst_executor, dst_dataset,
+                raw=raw, large_blocks=large_blocks,
             )
         return plan
 
-    src_snaps = list_snapshots(src_dataset, src_executor)
-    dst_snaps = list_snapshots(dst_dataset, dst_executor)
+    if listed is None:
+        token = get_resume_token(dst_dataset, dst_executor)
+    elif dst_dataset in listed.resume_errors:
+        plan.action = "error"
+        plan.message = f"Could not read receive_resume_token: {listed.resume_errors[dst_dataset]}"
+        return plan
+    else:
+        token = listed.resume_tokens.get(dst_dataset)
+    if token:
+        # Finish the interrupted stream first; the rest is planned afterwards
+        plan.action = "resume"
+        plan.resume_token = token
+        return plan
 
     if verbose:
         print(f"  {src_dataset}: {len(src_snaps)} src, {len(dst_snaps)} dst snapshots")
@@ -520,31 +1081,25 @@ def _plan_dataset(
         plan.message = "Source has no snapshots"
         return plan
 
-    common = find_common_snapshot(src_snaps, dst_snaps)
+    found = find_common_indices(src_snaps, dst_snaps)
 
-    if common is None:
+    if found is None:
         plan.action = "error"
         plan.message = "No common snapshot found between source and destination"
         plan.bootstrap_cmd = _format_bootstrap_command(
-            src_dataset, src_snaps[0].name, dst_executor, dst_dataset
+            src_dataset, src_snaps[0].name, dst_executor, dst_dataset,
+            raw=raw, large_blocks=large_blocks,
         )
         return plan
 
-    plan.common = common
+    common_src_idx, common_dst_idx = found
+    plan.common = src_snaps[common_src_idx]
 
-    # Check if rollback needed (dest has snapshots after common)
-    needs_rollback = dst_snaps and dst_snaps[-1].name != common.name
-    if needs_rollback:
-        # Find the common snapshot index in dst and collect victims
-        common_dst_idx = next(
-            i for i, s in enumerate(dst_snaps) if s.name == common.name
-        )
-        plan.rollback_victims = dst_snaps[common_dst_idx + 1:]
+    # Rollback needed if dest has snapshots after common; they are the victims
+    plan.rollback_victims = dst_snaps[common_dst_idx + 1:]
+    needs_rollback = bool(plan.rollback_victims)
 
     # Collect new snapshots to send
-    common_src_idx = next(
-        i for i, s in enumerate(src_snaps) if s.name == common.name
-    )
     new_snaps = src_snaps[common_src_idx + 1:]
 
     if not new_snaps and not needs_rollback:
@@ -564,6 +1119,191 @@ def _plan_dataset(
     return plan
 
 
+@dataclass
+class _SendOptions:
+    """Per-run settings shared by every dataset transfer in Phase 3."""
+    dry_run: bool = False
+    verbose: bool = False
+    raw: bool = False
+    large_blocks: bool = False
+    buffer_size: int = 0
+
+
+@dataclass
+class _PlanResult:
+    """Outcome of executing one dataset's plan."""
+    sent: bool = False
+    rolled_back: bool = False
+    error: bool = False
+
+
+def _send_plan(
+    plan: _DatasetPlan,
+    src_executor: "Executor",
+    dst_executor: "Executor",
+    options: _SendOptions,
+) -> bool:
+    """Send plan.common..plan.latest. Print the outcome; return True on success."""
+    try:
+        send_incremental(
+            common=plan.common, latest=plan.latest,
+            src_executor=src_executor, dst_executor=dst_executor,
+            dst_dataset=plan.dst_dataset, dry_run=options.dry_run, verbose=options.verbose,
+            buffer_size=options.buffer_size, raw=options.raw, large_blocks=options.large_blocks,
+        )
+    except ExecutorError as e:
+        print(f"  {RED}ERROR: Transfer failed: {e}{RESET}", file=sys.stderr)
+        return False
+    print(f"  {GREEN}Transfer complete.{RESET}")
+    return True
+
+
+def _execute_plan(
+    plan: _DatasetPlan,
+    src_executor: "Executor",
+    dst_executor: "Executor",
+    options: _SendOptions,
+) -> _PlanResult:
+    """Carry out one dataset's resume, rollback and/or send. Never prompts."""
+    result = _PlanResult()
+    print(f"\n{'='*60}")
+
+    if plan.action == "resume":
+        print(f"Resuming: {plan.src_dataset} -> {plan.dst_dataset}")
+        try:
+            send_resume(
+                plan.resume_token, src_executor=src_executor, dst_executor=dst_executor,
+                dst_dataset=plan.dst_dataset, dry_run=options.dry_run, verbose=options.verbose,
+                buffer_size=options.buffer_size,
+            )
+        except ExecutorError as e:
+            print(f"  {RED}ERROR: Resume failed: {e}{RESET}", file=sys.stderr)
+            print(
+                f"  If the stream can no longer be resumed (e.g. its source snapshot was\n"
+                f"  destroyed), discard the partial receive with:\n"
+                f"    zfs recv -A {plan.dst_dataset}",
+                file=sys.stderr,
+            )
+            result.error = True
+            return result
+        print(f"  {GREEN}Transfer complete.{RESET}")
+        result.sent = True
+        if options.dry_run:
+            return result
+
+        # The resumed stream may have been one snapshot of a larger -I range
+        try:
+            followup = _plan_dataset(
+                plan.src_dataset, plan.dst_dataset, src_executor, dst_executor, options.verbose,
+                raw=options.raw, large_blocks=options.large_blocks,
+            )
+        except ExecutorError as e:
+            print(f"  {YELLOW}Run backup again to continue: {e}{RESET}")
+            return result
+        if followup.action == "send":
+            print(f"  Sending {followup.new_snap_count} snapshot(s) up to @{followup.latest.name}")
+            result.error = not _send_plan(followup, src_executor, dst_executor, options)
+        elif followup.action != "up_to_date":
+            print(f"  {YELLOW}Run backup again to continue: {followup.message or followup.action}{RESET}")
+        return result
+
+    if plan.action in ("rollback_and_send", "rollback_only"):
+        print(f"Rolling back: {plan.dst_dataset} -> @{plan.common.name}")
+        if not options.dry_run:
+            try:
+                dst_executor.run(["zfs", "rollback", "-r", f"{plan.dst_dataset}@{plan.common.name}"])
+            except ExecutorError as e:
+                print(f"  {RED}ERROR: Rollback failed: {e}{RESET}", file=sys.stderr)
+                result.error = True
+                return result
+        else:
+            print(f"  [dry-run] zfs rollback -r {plan.dst_dataset}@{plan.common.name}")
+        result.rolled_back = True
+        if plan.latest:
+            print(f"  Sending {plan.new_snap_count} snapshot(s) up to @{plan.latest.name}")
+    else:
+        print(f"Sending: {plan.src_dataset} -> {plan.dst_dataset}")
+        print(f"  {plan.new_snap_count} snapshot(s) up to @{plan.latest.name}")
+
+    if plan.latest:
+        result.sent = _send_plan(plan, src_executor, dst_executor, options)
+        result.error = not result.sent
+    return result
+
+
+class _ThreadRoutedStream:
+    """
+    Stand-in for sys.stdout/sys.stderr that sends a thread's writes to that
+    thread's own buffer when one is set, and to the real stream otherwise.
+
+    Lets concurrent dataset transfers keep using plain print() while their
+    output is still shown one dataset at a time.
+    """
+
+    def __init__(self, real, local: threading.local, attr: str):
+        self._real = real
+        self._local = local
+        self._attr = attr
+
+    def write(self, text: str) -> int:
+        buf = getattr(self._local, self._attr, None)
+        return (buf if buf is not None else self._real).write(text)
+
+    def flush(self) -> None:
+        self._real.flush()
+
+    def __getattr__(self, name):
+        return getattr(self._real, name)
+
+
+def _execute_parallel(
+    plans: list[_DatasetPlan],
+    src_executor: "Executor",
+    dst_executor: "Executor",
+    options: _SendOptions,
+    max_parallel: int,
+) -> list[_PlanResult]:
+    """
+    Run _execute_plan for independent datasets on up to max_parallel threads.
+
+    Each dataset's output is buffered and printed as a block when it finishes,
+    so transfers never interleave on the terminal.
+    """
+    local = threading.local()
+    real_out, real_err = sys.stdout, sys.stderr
+
+    def worker(plan: _DatasetPlan) -> tuple[_PlanResult, str, str]:
+        local.out, local.err = io.StringIO(), io.StringIO()
+        # Never raise: an exception here would drop this dataset's buffered
+        # output and that of every dataset still running.
+        result = _PlanResult(error=True)
+        try:
+            result = _execute_plan(plan, src_executor, dst_executor, options)
+        except Exception as e:  # pylint: disable=broad-exception-caught
+            print(f"  {RED}ERROR: {plan.src_dataset}: unexpected {type(e).__name__}: {e}{RESET}",
+                  file=sys.stderr)
+        finally:
+            out, err = local.out.getvalue(), local.err.getvalue()
+        return result, out, err
+
+    import concurrent.futures  # only parallel backups need it
+
+    results: list[_PlanResult] = []
+    sys.stdout = _ThreadRoutedStream(real_out, local, "out")
+    sys.stderr = _ThreadRoutedStream(real_err, local, "err")
+    try:
+        with concurrent.futures.ThreadPoolExecutor(max_workers=max_parallel) as pool:
+            futures = [pool.submit(worker, plan) for plan in plans]
+            for future in concurrent.futures.as_completed(futures):
+                result, out, err = future.result()
+                real_out.write(out)
+                real_err.write(err)
+                results.append(result)
+    finally:
+        sys.stdout, sys.stderr = real_out, real_err
+    return results
+
+
 def run_backup(
     config: "JobConfig",
     src_executor: "Executor",
@@ -584,51 +1324,77 @@ def run_backup(
         return 1
 
     # --- Phase 1: Plan ---
+    dst_datasets = [config.destination.dataset_for(ds) for ds in config.datasets]
+    listed = _fetch_listings(config.datasets, src_executor, dst_datasets, dst_executor)
     plans: list[_DatasetPlan] = []
-    for src_dataset in config.datasets:
-        dst_dataset = config.destination.dataset_for(src_dataset)
-        plans.append(_plan_dataset(src_dataset, dst_dataset, src_executor, dst_executor, verbose))
-
-    rollback_plans = [p for p in plans if p.action in ("rollback_and_send", "rollback_only")]
-    send_plans    = [p for p in plans if p.action == "send"]
-    up_to_date    = [p for p in plans if p.action == "up_to_date"]
-    error_plans   = [p for p in plans if p.action == "error"]
-    skip_plans    = [p for p in plans if p.action == "skip"]
+    for src_dataset, dst_dataset in zip(config.datasets, dst_datasets):
+        plans.append(_plan_dataset(
+            src_dataset, dst_dataset, src_executor, dst_executor, verbose,
+            raw=config.source.raw, large_blocks=config.source.large_blocks,
+            listed=listed,
+        ))
+
+    # Partition plans by action in one pass. Both rollback actions share a
+    # list, so rollbacks keep their job-file order.
+    resume_plans: list[_DatasetPlan] = []
+    rollback_plans: list[_DatasetPlan] = []
+    send_plans: list[_DatasetPlan] = []
+    up_to_date: list[_DatasetPlan] = []
+    error_plans: list[_DatasetPlan] = []
+    skip_plans: list[_DatasetPlan] = []
+    by_action = {
+        "resume": resume_plans,
+        "rollback_and_send": rollback_plans,
+        "rollback_only": rollback_plans,
+        "send": send_plans,
+        "up_to_date": up_to_date,
+        "error": error_plans,
+        "skip": skip_plans,
+    }
+    for plan in plans:
+        by_action[plan.action].append(plan)
 
     # --- Print plan summary ---
+    # Each block is collected and written once rather than print()ed per
+    # line: large jobs produce a line per dataset and per rollback victim.
+    err_lines: list[str] = []
     for plan in error_plans:
-        print(f"\n{RED}ERROR: {plan.message}{RESET}", file=sys.stderr)
+        err_lines.append(f"\n{RED}ERROR: {plan.message}{RESET}")
         if plan.bootstrap_cmd:
-            print(f"  To initialize, run:\n    {plan.bootstrap_cmd}", file=sys.stderr)
-            print(
+            err_lines.append(f"  To initialize, run:\n    {plan.bootstrap_cmd}")
+            err_lines.append(
                 f"  {YELLOW}Consider creating the destination dataset first and setting desired\n"
                 f"  properties (e.g. compression, atime, readonly, com.sun:auto-snapshot=false)"
-                f"  before receiving.{RESET}",
-                file=sys.stderr,
+                f"  before receiving.{RESET}"
             )
+    _write_lines(err_lines, sys.stderr)
 
+    lines: list[str] = []
     for plan in skip_plans:
         if plan.message:
-            print(f"\n{plan.src_dataset}: {plan.message}")
+            lines.append(f"\n{plan.src_dataset}: {plan.message}")
 
     for plan in up_to_date:
-        print(f"\n{plan.src_dataset}: {GREEN}Up to date{RESET}")
+        lines.append(f"\n{plan.src_dataset}: {GREEN}Up to date{RESET}")
+
+    for plan in resume_plans:
+        lines.append(f"\n{plan.src_dataset}: Resume interrupted receive")
 
     for plan in send_plans:
-        print(f"\n{plan.src_dataset}: Send {plan.new_snap_count} snapshot(s) up to @{plan.latest.name}")
+        lines.append(f"\n{plan.src_dataset}: Send {plan.new_snap_count} snapshot(s) up to @{plan.latest.name}")
+    _write_lines(lines)
 
     # --- Phase 2: Prompt for rollbacks ---
     if rollback_plans:
-        print(f"\n{'='*60}")
-        print(f"{YELLOW}The following datasets require rollback before receiving:{RESET}\n")
+        lines = [f"\n{'='*60}", f"{YELLOW}The following datasets require rollback before receiving:{RESET}\n"]
         for plan in rollback_plans:
-            print(f"  {plan.dst_dataset}:")
-            print(f"    {GREEN}Rollback to: @{plan.common.name}{RESET}")
-            for victim in plan.rollback_victims:
-                print(f"    {RED}Delete:      @{victim.name}{RESET}")
+            lines.append(f"  {plan.dst_dataset}:")
+            lines.append(f"    {GREEN}Rollback to: @{plan.common.name}{RESET}")
+            lines.extend(f"    {RED}Delete:      @{victim.name}{RESET}" for victim in plan.rollback_victims)
             if plan.new_snap_count > 0:
-                print(f"    Then send {plan.new_snap_count} new snapshot(s)")
-            print()
+                lines.append(f"    Then send {plan.new_snap_count} new snapshot(s)")
+            lines.append("")
+        _write_lines(lines)
 
         prompt = ("[dry-run] " if dry_run else "") + "Proceed with rollbacks?"
         if not no_confirm and not _confirm(prompt):
@@ -636,56 +1402,20 @@ def run_backup(
             return 1
 
     # --- Phase 3: Execute ---
-    any_error = bool(error_plans)
-    sent_count = 0
-    rollback_count = 0
-
-    for plan in rollback_plans:
-        print(f"\n{'='*60}")
-        print(f"Rolling back: {plan.dst_dataset} -> @{plan.common.name}")
-        if not dry_run:
-            try:
-                dst_executor.run(["zfs", "rollback", "-r", f"{plan.dst_dataset}@{plan.common.name}"])
-                rollback_count += 1
-            except ExecutorError as e:
-                print(f"  {RED}ERROR: Rollback failed: {e}{RESET}", file=sys.stderr)
-                any_error = True
-                continue
-        else:
-            print(f"  [dry-run] zfs rollback -r {plan.dst_dataset}@{plan.common.name}")
-            rollback_count += 1
-
-        if plan.latest:
-            print(f"  Sending {plan.new_snap_count} snapshot(s) up to @{plan.latest.name}")
-            try:
-                send_incremental(
-                    common=plan.common, latest=plan.latest,
-                    src_executor=src_executor, dst_executor=dst_executor,
-                    dst_dataset=plan.dst_dataset, dry_run=dry_run, verbose=verbose,
-                )
-                sent_count += 1
-            except ExecutorError as e:
-                print(f"  {RED}ERROR: Transfer failed: {e}{RESET}", file=sys.stderr)
-                any_error = True
-                continue
-            print(f"  {GREEN}Transfer complete.{RESET}")
+    options = _SendOptions(
+        dry_run=dry_run, verbose=verbose,
+        raw=config.source.raw, large_blocks=config.source.large_blocks,
+        buffer_size=config.destination.buffer_mb * 1024 * 1024,
+    )
+    work = resume_plans + rollback_plans + send_plans
+    if config.max_parallel > 1 and len(work) > 1:
+        results = _execute_parallel(work, src_executor, dst_executor, options, config.max_parallel)
+    else:
+        results = [_execute_plan(plan, src_executor, dst_executor, options) for plan in work]
 
-    for plan in send_plans:
-        print(f"\n{'='*60}")
-        print(f"Sending: {plan.src_dataset} -> {plan.dst_dataset}")
-        print(f"  {plan.new_snap_count} snapshot(s) up to @{plan.latest.name}")
-        try:
-            send_incremental(
-                common=plan.common, latest=plan.latest,
-                src_executor=src_executor, dst_executor=dst_executor,
-                dst_dataset=plan.dst_dataset, dry_run=dry_run, verbose=verbose,
-            )
-            sent_count += 1
-        except ExecutorError as e:
-            print(f"  {RED}ERROR: Transfer failed: {e}{RESET}", file=sys.stderr)
-            any_error = True
-            continue
-        print(f"  {GREEN}Transfer complete.{RESET}")
+    any_error = bool(error_plans) or any(r.error for r in results)
+    sent_count = sum(r.sent for r in results)
+    rollback_count = sum(r.rolled_back for r in results)
 
     # --- Phase 4: Summary ---
     print(f"\n{'='*60}")
@@ -712,6 +1442,36 @@ def run_backup(
 # ============================================================
 
 
+def _qualify_rule(rule: RetentionRule, dataset: str) -> RetentionRule:
+    """Return rule matching full_name ("pool/ds@snap") for snapshots of dataset only.
+
+    The user's pattern is grouped so a top-level '|' stays inside it and
+    cannot bleed across datasets.
+    """
+    return RetentionRule(pattern=re.escape(dataset) + "@(?:" + rule.pattern + ")", keep=rule.keep)
+
+
+# Above this many rules the combined prefilter regex stops paying for itself
+# (compile time and memory grow with every alternative); match per rule only.
+UNION_MAX_RULES = 256
+
+
+def _union_prefilter(rules: list[RetentionRule]) -> re.Pattern[str] | None:
+    """Return one regex matching whatever any rule matches, or None if unsafe.
+
+    Only group-free patterns are combined: in an alternation, group names
+    from different rules collide and numbered backreferences shift to the
+    wrong group. Patterns that compile alone but not together (e.g. inline
+    global flags) fall back to per-rule matching as well.
+    """
+    if not 1 < len(rules) <= UNION_MAX_RULES or any(rule.regex.groups for rule in rules):
+        return None
+    try:
+        return re.compile("|".join(f"(?:{rule.pattern})" for rule in rules))
+    except re.error:
+        return None
+
+
 def _snapshots_to_delete(
     snapshots: list[Snapshot],
     rules: list[RetentionRule],
@@ -727,17 +1487,26 @@ def _snapshots_to_delete(
     to_delete: list[Snapshot] = []
     seen: set[str] = set()
 
-    for rule in rules:
-        matching = [s for s in snapshots if rule.matches(s.full_name)]
-        # matching is oldest→newest (same order as input)
-        if rule.keep == 0:
-            candidates = matching
-        elif len(matching) <= rule.keep:
-            candidates = []
-        else:
-            candidates = matching[: len(matching) - rule.keep]
-
-        for snap in candidates:
+    # Compile each pattern once and bucket snapshots per rule in a single pass.
+    # A snapshot may land in several buckets: rules are applied independently,
+    # so a single alternation cannot say which rules matched. It can still
+    # reject a snapshot no rule matches with one regex call, which is the
+    # common case (e.g. snapshots a retention rule doesn't cover at all).
+    compiled = [rule.regex for rule in rules]
+    any_rule = _union_prefilter(rules)
+    buckets: list[list[Snapshot]] = [[] for _ in rules]
+    for snap in snapshots:
+        full_name = snap.full_name
+        if any_rule is not None and not any_rule.fullmatch(full_name):
+            continue
+        for pattern, bucket in zip(compiled, buckets):
+            if pattern.fullmatch(full_name):
+                bucket.append(snap)
+
+    for rule, matching in zip(rules, buckets):
+        # matching is oldest→newest (same order as input), so the N newest are
+        # the tail: no per-rule sorting, just one slice.
+        for snap in matching[: max(0, len(matching) - rule.keep)]:
             if snap.full_name not in seen:
                 to_delete.append(snap)
                 seen.add(snap.full_name)
@@ -766,26 +1535,18 @@ def run_compact(
     # list of (dst_dataset, snapshots_to_delete) for datasets with work to do
     delete_plans: list[tuple[str, list[Snapshot]]] = []
 
-    for src_dataset in config.datasets:
-        dst_dataset = config.destination.dataset_for(src_dataset)
-
-        if not dataset_exists(dst_dataset, dst_executor):
+    dst_datasets = [config.destination.dataset_for(ds) for ds in config.datasets]
+    listed = snapshots_by_dataset(dst_datasets, dst_executor)
+    for dst_dataset in dst_datasets:
+        snaps = listed[dst_dataset]
+        if snaps is None:
             print(f"\n{dst_dataset}: dataset does not exist, skipping.")
             continue
 
-        snaps = list_snapshots(dst_dataset, dst_executor)
         if verbose:
             print(f"\n{dst_dataset}: {len(snaps)} total snapshots")
 
-        # Qualify each rule with the destination dataset path so the regex
-        # matches full_name ("pool/ds@snap") and cannot bleed across datasets.
-        qualified_rules = [
-            RetentionRule(
-                pattern=re.escape(dst_dataset) + "@" + rule.pattern,
-                keep=rule.keep,
-            )
-            for rule in config.compaction
-        ]
+        qualified_rules = [_qualify_rule(rule, dst_dataset) for rule in config.compaction]
         to_delete = _snapshots_to_delete(snaps, qualified_rules)
 
         if not to_delete:
@@ -819,13 +1580,25 @@ def run_compact(
         print(f"\n{'='*60}")
         print(f"Compacting: {dst_dataset}")
         deleted = 0
-        for snap in to_delete:
+        for batch in destroy_batches(to_delete):
             try:
-                destroy_snapshot(snap, dst_executor, dry_run=dry_run, verbose=verbose)
-                deleted += 1
+                destroy_snapshots(batch, dst_executor, dry_run=dry_run, verbose=verbose)
+                deleted += len(batch)
+                continue
             except ExecutorError as e:
-                print(f"  ERROR destroying {snap.full_name}: {e}", file=sys.stderr)
-                any_error = True
+                if len(batch) == 1:
+                    print(f"  ERROR destroying {batch[0].full_name}: {e}", file=sys.stderr)
+                    any_error = True
+                    continue
+            # The batch failed as a whole; retry one at a time so the
+            # destroyable snapshots still go and the culprits are reported.
+            for snap in batch:
+                try:
+                    destroy_snapshot(snap, dst_executor, dry_run=dry_run, verbose=verbose)
+                    deleted += 1
+                except ExecutorError as e:
+                    print(f"  ERROR destroying {snap.full_name}: {e}", file=sys.stderr)
+                    any_error = True
         print("  " + ("[dry run] " if dry_run else "") + f"Deleted {deleted} of {len(to_delete)} snapshot(s).")
 
     return 1 if any_error else 0
@@ -893,31 +1666,31 @@ def cmd_status(args) -> int:
 
     src_exec, dst_exec = _make_executors(config)
     any_error = False
-    for src_dataset in config.datasets:
-        dst_dataset = config.destination.dataset_for(src_dataset)
-        try:
-            src_snaps = list_snapshots(src_dataset, src_exec)
-        except ExecutorError:
-            print(f"{src_dataset}: ERROR (source dataset not found)")
+    dst_datasets = [config.destination.dataset_for(ds) for ds in config.datasets]
+    src_listed, dst_listed = snapshots_by_dataset_both(config.datasets, src_exec, dst_datasets, dst_exec)
+    lines: list[str] = []
+    for src_dataset, dst_dataset in zip(config.datasets, dst_datasets):
+        src_snaps = src_listed[src_dataset]
+        if src_snaps is None:
+            lines.append(f"{src_dataset}: ERROR (source dataset not found)")
             any_error = True
             continue
-        try:
-            dst_snaps = list_snapshots(dst_dataset, dst_exec)
-        except ExecutorError:
-            print(f"{src_dataset}: DESTINATION MISSING")
+        dst_snaps = dst_listed[dst_dataset]
+        if dst_snaps is None:
+            lines.append(f"{src_dataset}: DESTINATION MISSING")
             any_error = True
             continue
 
-        common = find_common_snapshot(src_snaps, dst_snaps)
-        if common is None:
+        found = find_common_indices(src_snaps, dst_snaps)
+        if found is None:
             status = "NO COMMON SNAPSHOT (needs bootstrap)"
         else:
-            common_idx = next(i for i, s in enumerate(src_snaps) if s.name == common.name)
-            behind = len(src_snaps) - common_idx - 1
+            behind = len(src_snaps) - found[0] - 1
             status = "UP TO DATE" if behind == 0 else f"{behind} snapshot(s) behind"
 
-        print(f"{src_dataset}: {status}")
+        lines.append(f"{src_dataset}: {status}")
 
+    _write_lines(lines)
     return 1 if any_error else 0
 
 
@@ -977,7 +1750,14 @@ def main(argv=None) -> None:
     p_discover.set_defaults(func=cmd_discover)
 
     args = parser.parse_args(argv)
-    sys.exit(args.func(args))
+    try:
+        rc = args.func(args)
+    except KeyboardInterrupt:
+        # Children (zfs, ssh) share our process group and got the SIGINT too;
+        # an interrupted recv -s leaves a resume token for the next backup.
+        print("\nInterrupted.", file=sys.stderr)
+        rc = 130
+    sys.exit(rc)
 
 
 if __name__ == "__main__":
@@ -3,12 +3,30 @@
 """MockExecutor and shared fixtures for testing."""
 from __future__ import annotations
 
+import functools
 import io
+import re
+import shlex
 import subprocess
-from unittest.mock import MagicMock
+import sys
+import threading
+from collections import ChainMap, deque
+from collections.abc import Mapping
+from types import MappingProxyType, SimpleNamespace
 
 import pytest
 
+_MISSING = object()
+WILDCARD = "*"  # last token of a response key that matches any command suffix
+
+
+def _intern_keys(responses: Mapping) -> dict:
+    """Copy responses with tuple-key tokens interned, so lookups hash shared strings."""
+    return {
+        (tuple(sys.intern(part) for part in key) if isinstance(key, tuple) else key): value
+        for key, value in responses.items()
+    }
+
 
 class MockExecutor:
     """
@@ -17,59 +35,110 @@ class MockExecutor:
     responses: dict mapping frozenset(cmd) or tuple(cmd) -> stdout string
     If the command isn't found, raises KeyError (to catch unexpected calls in tests).
 
+    A tuple key ending in "*" is a wildcard matching any command that starts
+    with the tokens before it, e.g. ("zfs", "destroy", "*") answers every destroy.
+    Exact keys win; among wildcards, the longest prefix wins.
+
     Pass verbose=True to print every command that goes through the executor.
     """
 
-    def __init__(self, responses: dict | None = None, is_verbose: bool = False, label: str = "mock"):
-        self.responses: dict = responses or {}
+    def __init__(self, responses: Mapping | None = None, is_verbose: bool = False, label: str = "mock"):
+        self.responses: Mapping
+        if isinstance(responses, MappingProxyType):
+            # Shared read-only responses (see standard_responses): overlay, don't copy
+            self.responses = ChainMap({}, responses)
+        else:
+            self.responses = _intern_keys(responses or {})
         self.verbose = is_verbose
         self._label = label
-        self.calls: list[list[str]] = []  # record of all commands run
-        self.popen_calls: list[tuple[list[str], list[str]]] = []  # (send_cmd, recv_cmd)
+        # Record of all commands run, as tuples. See `calls`, `calls_of` and `count_where`.
+        self.cmd_full: deque[tuple[str, ...]] = deque()
+        self._lock = threading.Lock()  # parallel backups record from several threads
+        self.popen_calls: deque[tuple[list[str], list[str]]] = deque()  # (send_cmd, recv_cmd)
 
     @property
     def label(self) -> str:
         return self._label
 
+    @property
+    def calls(self) -> list[list[str]]:
+        """All recorded commands, in order, as lists (as passed to run/popen)."""
+        return [list(c) for c in self.cmd_full]
+
+    def count_where(self, verb: str) -> int:
+        """Number of recorded commands whose subcommand is verb (e.g. "destroy")."""
+        return sum(1 for c in self.cmd_full if c[1:2] == (verb,))
+
+    def calls_of(self, *verb: str) -> list[list[str]]:
+        """Recorded commands starting with verb, e.g. calls_of("zfs", "destroy")."""
+        return [list(c) for c in self.cmd_full if c[:len(verb)] == verb]
+
     def _key(self, cmd: list[str]) -> tuple:
         return tuple(cmd)
 
-    def run(self, cmd: list[str]) -> str:
-        self.calls.append(cmd)
+    def _prefix_lookup(self, key: tuple):
+        # Read from the live responses: tests may script more after construction
+        prefixes = sorted(
+            (k[:-1] for k in self.responses
+             if isinstance(k, tuple) and k and k[-1] == WILDCARD),
+            key=len, reverse=True,
+        )
+        for prefix in prefixes:
+            if key[:len(prefix)] == prefix:
+                return self.responses[prefix + (WILDCARD,)]
+        return _MISSING
+
+    def _record(self, cmd: list[str]) -> tuple:
         key = self._key(cmd)
+        with self._lock:
+            self.cmd_full.append(key)
+        return key
+
+    def run(self, cmd: list[str]) -> str:
+        key = self._record(cmd)
         if self.verbose:
-            import shlex
             print(f"  [mock.run] {shlex.join(cmd)}")
-        if key not in self.responses:
+        result = self.responses.get(key, _MISSING)
+        if result is _MISSING:
+            result = self._prefix_lookup(key)
+        if result is _MISSING:
             raise KeyError(f"MockExecutor: unexpected command: {cmd}")
-        result = self.responses[key]
         if isinstance(result, Exception):
             raise result
         return result
 
+    def iter_lines(self, cmd: list[str]):
+        """Scripted like run(): the response string, split into lines."""
+        yield from io.StringIO(self.run(cmd))
+
     def popen(self, cmd: list[str], **_kwargs) -> subprocess.Popen:
         """
         For send/recv pipe tests: record the call and return mock Popen objects
         that succeed immediately.
         """
-        self.calls.append(cmd)
+        self._record(cmd)
         if self.verbose:
-            import shlex
             print(f"  [mock.popen] {shlex.join(cmd)}")
 
-        mock_proc = MagicMock(spec=subprocess.Popen)
-        mock_proc.stdout = io.BytesIO(b"")
-        mock_proc.stdin = io.BytesIO(b"")
-        mock_proc.returncode = 0
-        mock_proc.wait.return_value = 0
-        return mock_proc
+        # Plain namespace instead of MagicMock(spec=Popen): spec introspection
+        # is costly and only this small surface is used by send_incremental.
+        # Streams are per-call because the caller closes stdout.
+        return SimpleNamespace(
+            stdout=io.BytesIO(b""),
+            stdin=io.BytesIO(b""),
+            returncode=0,
+            wait=lambda timeout=None: 0,
+            poll=lambda: 0,
+            kill=lambda: None,
+            communicate=lambda input=None, timeout=None: (b"", b""),
+        )
 
 
 # ---------------------------------------------------------------------------
 # Snapshot data drawn from the real examples in the prompt
 # ---------------------------------------------------------------------------
 
-SRC_USER_SNAPS = [
+SRC_USER_SNAPS = (
     "ipool/home/user@zfs-auto-snap_monthly-2025-09-18-1447",
     "ipool/home/user@zfs-auto-snap_monthly-2025-10-18-1640",
     "ipool/home/user@backup10t-push-2025-11-11",
@@ -91,25 +160,43 @@ SRC_USER_SNAPS = [
     "ipool/home/user@zfs-auto-snap_hourly-2026-02-17-1917",
     "ipool/home/user@zfs-auto-snap_frequent-2026-02-17-2200",
     "ipool/home/user@zfs-auto-snap_frequent-2026-02-17-2215",
-]
+)
 
 # Destination has synced up to backup10t-push-2025-11-11
-DST_USER_SNAPS = [
+DST_USER_SNAPS = (
     "xeonpool/BACKUP/ipool/home/user@zfs-auto-snap_monthly-2025-09-18-1447",
     "xeonpool/BACKUP/ipool/home/user@zfs-auto-snap_monthly-2025-10-18-1640",
     "xeonpool/BACKUP/ipool/home/user@backup10t-push-2025-11-11",
-]
+)
+
 
+def list_cmd(*datasets: str) -> tuple:
+    """Key for the single 'zfs list' that both checks datasets exist and lists their snapshots.
 
-def _snap_list_output(full_names: list[str]) -> str:
+    With several datasets this is the batched listing backup/compact/status make per side.
+    """
+    return ("zfs", "list", "-H", "-o", "name", "-t", "filesystem,volume,snapshot", "-d", "1", *datasets)
+
+
+def resume_token_cmd(*datasets: str) -> tuple:
+    """Key for the single 'zfs get' of receive_resume_token across destination datasets."""
+    return ("zfs", "get", "-H", "-o", "name,value", "receive_resume_token", *datasets)
+
+
+@functools.lru_cache(maxsize=64)
+def _joined_snap_list(full_names: tuple[str, ...]) -> str:
     return "\n".join(full_names) + "\n"
 
 
+def _snap_list_output(full_names) -> str:
+    return _joined_snap_list(tuple(full_names))
+
+
 def make_standard_responses(
     src_dataset: str = "ipool/home/user",
     dst_dataset: str = "xeonpool/BACKUP/ipool/home/user",
-    src_snaps: list[str] | None = None,
-    dst_snaps: list[str] | None = None,
+    src_snaps: tuple[str, ...] | list[str] | None = None,
+    dst_snaps: tuple[str, ...] | list[str] | None = None,
 ) -> tuple[dict, dict]:
     """
     Return (src_responses, dst_responses) dicts for MockExecutors.
@@ -120,22 +207,38 @@ def make_standard_responses(
         dst_snaps = DST_USER_SNAPS
 
     src_responses = {
-        ("zfs", "list", "-H", "-o", "name", "-t", "snapshot", "-r", src_dataset):
-            _snap_list_output(src_snaps),
-        ("zfs", "list", "-H", "-o", "name", src_dataset):
-            src_dataset + "\n",
+        list_cmd(src_dataset): _snap_list_output((src_dataset, *src_snaps)),
     }
 
     dst_responses = {
-        ("zfs", "list", "-H", "-o", "name", "-t", "snapshot", "-r", dst_dataset):
-            _snap_list_output(dst_snaps),
-        ("zfs", "list", "-H", "-o", "name", dst_dataset):
-            dst_dataset + "\n",
+        list_cmd(dst_dataset): _snap_list_output((dst_dataset, *dst_snaps)),
+        resume_token_cmd(dst_dataset): f"{dst_dataset}\t-\n",
     }
 
     return src_responses, dst_responses
 
 
+def assert_contains_all(text: str, patterns: list[str]) -> None:
+    """Assert every pattern occurs in text, scanning text once.
+
+    Patterns are combined into a single alternation; any pattern the scan
+    missed (e.g. because it overlaps another match) is checked directly.
+    """
+    found = set(re.findall("|".join(map(re.escape, patterns)), text))
+    missing = [p for p in patterns if p not in found and p not in text]
+    assert not missing, f"missing from output: {missing!r}"
+
+
+@pytest.fixture(scope="session")
+def standard_responses() -> tuple[MappingProxyType, MappingProxyType]:
+    """Read-only make_standard_responses() output, built once per session.
+
+    MockExecutor layers a per-instance ChainMap over these instead of copying.
+    """
+    src_responses, dst_responses = make_standard_responses()
+    return MappingProxyType(_intern_keys(src_responses)), MappingProxyType(_intern_keys(dst_responses))
+
+
 @pytest.fixture
 def verbose(request):
     """True if -v was passed to pytest."""
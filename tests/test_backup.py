@@ -3,8 +3,15 @@
 """Tests for mzb.backup module."""
 from __future__ import annotations
 
-from mzb import run_backup, ExecutorError, DestinationConfig, JobConfig, SourceConfig
-from tests.conftest import MockExecutor, make_standard_responses
+from unittest.mock import patch
+
+from mzb import (
+    run_backup, send_incremental, send_resume, ExecutorError, DestinationConfig, JobConfig, SourceConfig,
+)
+from tests.conftest import (
+    MockExecutor, assert_contains_all, list_cmd, make_standard_responses,
+    resume_token_cmd,
+)
 
 SRC = "ipool/home/user"
 DST = "xeonpool/BACKUP/ipool/home/user"
@@ -18,8 +25,8 @@ def _make_config(datasets=None):
     )
 
 
-def test_backup_happy_path_dry_run(capsys):
-    src_r, dst_r = make_standard_responses()
+def test_backup_happy_path_dry_run(capsys, standard_responses):
+    src_r, dst_r = standard_responses
     src_exec = MockExecutor(src_r)
     dst_exec = MockExecutor(dst_r)
     config = _make_config()
@@ -28,8 +35,24 @@ def test_backup_happy_path_dry_run(capsys):
 
     assert rc == 0
     captured = capsys.readouterr()
-    assert "zfs send" in captured.out
-    assert "zfs recv" in captured.out
+    assert_contains_all(captured.out, ["zfs send", "zfs recv"])
+
+
+def test_backup_sends_one_stream_per_dataset(standard_responses):
+    """All new snapshots go in one 'zfs send -I common latest' stream, not one send each."""
+    src_r, dst_r = standard_responses
+    src_exec = MockExecutor(src_r)
+    dst_exec = MockExecutor(dst_r)
+
+    rc = run_backup(_make_config(), src_exec, dst_exec, dry_run=False, no_confirm=True)
+
+    assert rc == 0
+    assert src_exec.calls_of("zfs", "send") == [[
+        "zfs", "send", "-c", "-I",
+        f"{SRC}@backup10t-push-2025-11-11",
+        f"{SRC}@zfs-auto-snap_frequent-2026-02-17-2215",
+    ]]
+    assert dst_exec.count_where("recv") == 1
 
 
 def test_backup_up_to_date(capsys):
@@ -37,14 +60,13 @@ def test_backup_up_to_date(capsys):
     snap = "ipool/home/user@zfs-auto-snap_monthly-2026-01-14-1600"
     dst_snap = snap.replace("ipool/home/user", DST)
     src_r = {
-        ("zfs", "list", "-H", "-o", "name", "-t", "snapshot", "-r", SRC):
-            snap + "\n",
-        ("zfs", "list", "-H", "-o", "name", SRC): SRC + "\n",
+        list_cmd(SRC):
+            SRC + "\n" + snap + "\n",
     }
     dst_r = {
-        ("zfs", "list", "-H", "-o", "name", "-t", "snapshot", "-r", DST):
-            dst_snap + "\n",
-        ("zfs", "list", "-H", "-o", "name", DST): DST + "\n",
+        list_cmd(DST):
+            DST + "\n" + dst_snap + "\n",
+        resume_token_cmd(DST): f"{DST}\t-\n",
     }
     src_exec = MockExecutor(src_r)
     dst_exec = MockExecutor(dst_r)
@@ -57,14 +79,13 @@ def test_backup_up_to_date(capsys):
 def test_backup_no_common_snapshot(capsys):
     """When no common snapshot exists, skip and print bootstrap command."""
     src_r = {
-        ("zfs", "list", "-H", "-o", "name", "-t", "snapshot", "-r", SRC):
-            "ipool/home/user@snap-new\n",
-        ("zfs", "list", "-H", "-o", "name", SRC): SRC + "\n",
+        list_cmd(SRC):
+            SRC + "\nipool/home/user@snap-new\n",
     }
     dst_r = {
-        ("zfs", "list", "-H", "-o", "name", "-t", "snapshot", "-r", DST):
-            "xeonpool/BACKUP/ipool/home/user@snap-old\n",
-        ("zfs", "list", "-H", "-o", "name", DST): DST + "\n",
+        list_cmd(DST):
+            DST + "\nxeonpool/BACKUP/ipool/home/user@snap-old\n",
+        resume_token_cmd(DST): f"{DST}\t-\n",
     }
     src_exec = MockExecutor(src_r)
     dst_exec = MockExecutor(dst_r)
@@ -72,21 +93,54 @@ def test_backup_no_common_snapshot(capsys):
     assert rc == 1  # partial failure
     captured = capsys.readouterr()
     assert "No common snapshot" in captured.err
-    assert "zfs send " in captured.err  # bootstrap command shown
+    assert "zfs send -c ipool/home/user@snap-new | zfs recv -F" in captured.err  # bootstrap command shown
+
+
+def test_backup_raw_bootstrap_command(capsys):
+    """With source.raw, the printed bootstrap command uses a raw send too."""
+    src_r = {
+        list_cmd(SRC):
+            SRC + "\nipool/home/user@snap-new\n",
+    }
+    dst_r = {
+        list_cmd(DST):
+            DST + "\nxeonpool/BACKUP/ipool/home/user@snap-old\n",
+        resume_token_cmd(DST): f"{DST}\t-\n",
+    }
+    config = _make_config()
+    config.source.raw = True
+    rc = run_backup(config, MockExecutor(src_r), MockExecutor(dst_r), dry_run=True, no_confirm=True)
+    assert rc == 1
+    captured = capsys.readouterr()
+    assert "zfs send -w ipool/home/user@snap-new | zfs recv -F" in captured.err
+
+
+def test_backup_large_blocks_in_send_and_bootstrap(capsys, standard_responses):
+    """source.large_blocks adds -L -e to incrementals and to the bootstrap it prints."""
+    src_r, dst_r = standard_responses
+    src_exec = MockExecutor(src_r)
+    config = _make_config()
+    config.source.large_blocks = True
+    rc = run_backup(config, src_exec, MockExecutor(dst_r), dry_run=False, no_confirm=True)
+    assert rc == 0
+    assert src_exec.calls_of("zfs", "send")[0][:5] == ["zfs", "send", "-L", "-e", "-c"]
+
+    missing = {list_cmd(DST): ExecutorError(["zfs", "list"], 1, "does not exist")}
+    run_backup(config, MockExecutor(src_r), MockExecutor(missing), dry_run=True, no_confirm=True)
+    assert "zfs send -L -e -c ipool/home/user@" in capsys.readouterr().err
 
 
 def test_backup_dest_missing(capsys):
     """When destination dataset doesn't exist, skip and show bootstrap command."""
     src_r = {
-        ("zfs", "list", "-H", "-o", "name", "-t", "snapshot", "-r", SRC):
-            "ipool/home/user@snap-a\n",
-        ("zfs", "list", "-H", "-o", "name", SRC): SRC + "\n",
-        ("zfs", "list", "-H", "-o", "name", DST):
+        list_cmd(SRC):
+            SRC + "\nipool/home/user@snap-a\n",
+        list_cmd(DST):
             ExecutorError(["zfs", "list"], 1, "does not exist"),
     }
     src_exec = MockExecutor(src_r)
     dst_r = {
-        ("zfs", "list", "-H", "-o", "name", DST):
+        list_cmd(DST):
             ExecutorError(["zfs", "list"], 1, "does not exist"),
     }
     dst_exec = MockExecutor(dst_r)
@@ -101,17 +155,16 @@ def test_backup_rollback_needed(capsys):
     # Src: snap-a, snap-b, snap-c
     # Dst: snap-a, snap-b, snap-d (snap-d not on src)
     src_r = {
-        ("zfs", "list", "-H", "-o", "name", "-t", "snapshot", "-r", SRC):
-            "ipool/home/user@snap-a\nipool/home/user@snap-b\nipool/home/user@snap-c\n",
-        ("zfs", "list", "-H", "-o", "name", SRC): SRC + "\n",
+        list_cmd(SRC):
+            SRC + "\nipool/home/user@snap-a\nipool/home/user@snap-b\nipool/home/user@snap-c\n",
     }
     dst_r = {
-        ("zfs", "list", "-H", "-o", "name", "-t", "snapshot", "-r", DST): (
+        list_cmd(DST): DST + "\n" + (
             "xeonpool/BACKUP/ipool/home/user@snap-a\n"
             "xeonpool/BACKUP/ipool/home/user@snap-b\n"
             "xeonpool/BACKUP/ipool/home/user@snap-d\n"
         ),
-        ("zfs", "list", "-H", "-o", "name", DST): DST + "\n",
+        resume_token_cmd(DST): f"{DST}\t-\n",
     }
     src_exec = MockExecutor(src_r)
     dst_exec = MockExecutor(dst_r)
@@ -119,9 +172,8 @@ def test_backup_rollback_needed(capsys):
     assert rc == 0  # dry-run rollback + send succeeds
     captured = capsys.readouterr()
     assert "rollback" in captured.out.lower()
-    assert "Rollback to: @snap-b" in captured.out
-    assert "@snap-d" in captured.out  # victim shown
-    assert "1 rollback(s)" in captured.out  # summary
+    # rollback target, victim shown, summary
+    assert_contains_all(captured.out, ["Rollback to: @snap-b", "@snap-d", "1 rollback(s)"])
 
 
 def test_backup_no_rollback_when_common_is_dest_head(capsys):
@@ -129,17 +181,16 @@ def test_backup_no_rollback_when_common_is_dest_head(capsys):
     # Src: snap-a, snap-b, snap-c
     # Dst: snap-a, snap-d, snap-b  (snap-d not on src, but common=b is HEAD)
     src_r = {
-        ("zfs", "list", "-H", "-o", "name", "-t", "snapshot", "-r", SRC):
-            "ipool/home/user@snap-a\nipool/home/user@snap-b\nipool/home/user@snap-c\n",
-        ("zfs", "list", "-H", "-o", "name", SRC): SRC + "\n",
+        list_cmd(SRC):
+            SRC + "\nipool/home/user@snap-a\nipool/home/user@snap-b\nipool/home/user@snap-c\n",
     }
     dst_r = {
-        ("zfs", "list", "-H", "-o", "name", "-t", "snapshot", "-r", DST): (
+        list_cmd(DST): DST + "\n" + (
             "xeonpool/BACKUP/ipool/home/user@snap-a\n"
             "xeonpool/BACKUP/ipool/home/user@snap-d\n"
             "xeonpool/BACKUP/ipool/home/user@snap-b\n"
         ),
-        ("zfs", "list", "-H", "-o", "name", DST): DST + "\n",
+        resume_token_cmd(DST): f"{DST}\t-\n",
     }
     src_exec = MockExecutor(src_r)
     dst_exec = MockExecutor(dst_r)
@@ -155,18 +206,17 @@ def test_backup_common_later_than_dest_only_snaps(capsys):
     # Src: snap-a, snap-b, snap-c
     # Dst: snap-a, snap-d, snap-b, snap-c  (common=c is HEAD, up to date)
     src_r = {
-        ("zfs", "list", "-H", "-o", "name", "-t", "snapshot", "-r", SRC):
-            "ipool/home/user@snap-a\nipool/home/user@snap-b\nipool/home/user@snap-c\n",
-        ("zfs", "list", "-H", "-o", "name", SRC): SRC + "\n",
+        list_cmd(SRC):
+            SRC + "\nipool/home/user@snap-a\nipool/home/user@snap-b\nipool/home/user@snap-c\n",
     }
     dst_r = {
-        ("zfs", "list", "-H", "-o", "name", "-t", "snapshot", "-r", DST): (
+        list_cmd(DST): DST + "\n" + (
             "xeonpool/BACKUP/ipool/home/user@snap-a\n"
             "xeonpool/BACKUP/ipool/home/user@snap-d\n"
             "xeonpool/BACKUP/ipool/home/user@snap-b\n"
             "xeonpool/BACKUP/ipool/home/user@snap-c\n"
         ),
-        ("zfs", "list", "-H", "-o", "name", DST): DST + "\n",
+        resume_token_cmd(DST): f"{DST}\t-\n",
     }
     src_exec = MockExecutor(src_r)
     dst_exec = MockExecutor(dst_r)
@@ -182,17 +232,16 @@ def test_backup_rollback_only_no_new_snaps(capsys):
     # Src: snap-a, snap-b (common=snap-b, no new snaps)
     # Dst: snap-a, snap-b, snap-d (snap-d not on src, needs rollback)
     src_r = {
-        ("zfs", "list", "-H", "-o", "name", "-t", "snapshot", "-r", SRC):
-            "ipool/home/user@snap-a\nipool/home/user@snap-b\n",
-        ("zfs", "list", "-H", "-o", "name", SRC): SRC + "\n",
+        list_cmd(SRC):
+            SRC + "\nipool/home/user@snap-a\nipool/home/user@snap-b\n",
     }
     dst_r = {
-        ("zfs", "list", "-H", "-o", "name", "-t", "snapshot", "-r", DST): (
+        list_cmd(DST): DST + "\n" + (
             "xeonpool/BACKUP/ipool/home/user@snap-a\n"
             "xeonpool/BACKUP/ipool/home/user@snap-b\n"
             "xeonpool/BACKUP/ipool/home/user@snap-d\n"
         ),
-        ("zfs", "list", "-H", "-o", "name", DST): DST + "\n",
+        resume_token_cmd(DST): f"{DST}\t-\n",
         ("zfs", "rollback", "-r", f"{DST}@snap-b"): "",
     }
     src_exec = MockExecutor(src_r)
@@ -201,19 +250,15 @@ def test_backup_rollback_only_no_new_snaps(capsys):
     rc = run_backup(_make_config(), src_exec, dst_exec, dry_run=False, no_confirm=True)
     assert rc == 0
     captured = capsys.readouterr()
-    assert "Rollback to: @snap-b" in captured.out
-    assert "@snap-d" in captured.out  # victim shown
+    assert_contains_all(captured.out, ["Rollback to: @snap-b", "@snap-d"])  # victim shown
     # Should rollback but NOT send (no new snapshots)
     assert "zfs send" not in captured.out
-    rollback_cmds = [c for c in dst_exec.calls if "rollback" in str(c)]
-    assert len(rollback_cmds) == 1
+    assert dst_exec.count_where("rollback") == 1
 
 
-def test_backup_send_failure(capsys):
+def test_backup_send_failure(capsys, standard_responses):
     """When send/recv fails, report error and continue to next dataset."""
-    from unittest.mock import patch
-
-    src_r, dst_r = make_standard_responses()
+    src_r, dst_r = standard_responses
     src_exec = MockExecutor(src_r)
     dst_exec = MockExecutor(dst_r)
 
@@ -228,3 +273,197 @@ def test_backup_send_failure(capsys):
     assert rc == 1
     captured = capsys.readouterr()
     assert "ERROR" in captured.err or "ERROR" in captured.out
+
+
+def _resume_responses(token: str) -> tuple[dict, dict]:
+    src_r = {
+        list_cmd(SRC): SRC + "\n",
+    }
+    dst_r = {
+        list_cmd(DST): DST + "\n",
+        resume_token_cmd(DST): f"{DST}\t{token}\n",
+    }
+    return src_r, dst_r
+
+
+def test_backup_resumes_interrupted_receive(capsys):
+    """A receive_resume_token on the destination is resumed with 'zfs send -t'."""
+    src_r, dst_r = _resume_responses("1-abc-def")
+    rc = run_backup(
+        _make_config(), MockExecutor(src_r), MockExecutor(dst_r),
+        dry_run=True, no_confirm=True,
+    )
+    assert rc == 0
+    captured = capsys.readouterr()
+    assert_contains_all(captured.out, [
+        "Resume interrupted receive", "zfs send -t 1-abc-def", f"zfs recv -s {DST}",
+    ])
+
+
+def test_backup_resume_then_sends_the_rest():
+    """After a live resume the dataset is re-planned and the remaining snapshots are sent."""
+    src_r = {list_cmd(SRC): f"{SRC}\n{SRC}@snap-a\n{SRC}@snap-b\n{SRC}@snap-c\n"}
+    dst_r = {
+        list_cmd(DST): f"{DST}\n{DST}@snap-a\n",
+        resume_token_cmd(DST): f"{DST}\t1-abc-def\n",
+    }
+    src_exec = MockExecutor(src_r)
+    dst_exec = MockExecutor(dst_r)
+    def resume_and_land(*args, **kwargs):
+        send_resume(*args, **kwargs)
+        # The resumed stream delivered snap-b and cleared the token
+        dst_exec.responses[list_cmd(DST)] = f"{DST}\n{DST}@snap-a\n{DST}@snap-b\n"
+        dst_exec.responses[("zfs", "get", "-H", "-o", "value", "receive_resume_token", DST)] = "-\n"
+
+    with patch("mzb.send_resume", side_effect=resume_and_land):
+        rc = run_backup(_make_config(), src_exec, dst_exec, dry_run=False, no_confirm=True)
+
+    assert rc == 0
+    assert src_exec.calls_of("zfs", "send") == [
+        ["zfs", "send", "-t", "1-abc-def"],
+        ["zfs", "send", "-c", "-I", f"{SRC}@snap-b", f"{SRC}@snap-c"],
+    ]
+    assert dst_exec.calls_of("zfs", "recv") == [["zfs", "recv", "-s", DST]] * 2
+    # Re-planned from fresh listings, not the ones taken before the resume
+    assert dst_exec.calls_of("zfs", "get")[-1] == [
+        "zfs", "get", "-H", "-o", "value", "receive_resume_token", DST,
+    ]
+    assert src_exec.count_where("list") == 2 and dst_exec.count_where("list") == 2
+
+
+def test_backup_resume_replan_failure_asks_for_another_run(capsys):
+    """A failed zfs get while re-planning after a resume does not crash the run."""
+    src_r, dst_r = _resume_responses("1-abc-def")
+    dst_r[("zfs", "get", "-H", "-o", "value", "receive_resume_token", DST)] = (
+        ExecutorError(["zfs", "get"], 1, "connection reset")
+    )
+    rc = run_backup(
+        _make_config(), MockExecutor(src_r), MockExecutor(dst_r),
+        dry_run=False, no_confirm=True,
+    )
+    assert rc == 0
+    assert "Run backup again to continue" in capsys.readouterr().out
+
+
+def test_backup_resume_failure_suggests_abort(capsys):
+    src_r, dst_r = _resume_responses("1-abc-def")
+    with patch(
+        "mzb.send_resume",
+        side_effect=ExecutorError(["zfs", "send"], 1, "resume token is corrupt"),
+    ):
+        rc = run_backup(
+            _make_config(), MockExecutor(src_r), MockExecutor(dst_r),
+            dry_run=False, no_confirm=True,
+        )
+    assert rc == 1
+    captured = capsys.readouterr()
+    assert f"zfs recv -A {DST}" in captured.err
+
+
+def _parallel_responses(datasets: list[str]) -> tuple[dict, dict]:
+    """Responses for a parallel backup of datasets, each with one new snapshot."""
+    # All datasets of each side are listed with one zfs list
+    dst_datasets = [f"xeonpool/BACKUP/{ds}" for ds in datasets]
+    src_r = {list_cmd(*datasets): ""}
+    dst_r = {list_cmd(*dst_datasets): ""}
+    for ds in datasets:
+        s, d = make_standard_responses(
+            src_dataset=ds, dst_dataset=f"xeonpool/BACKUP/{ds}",
+            src_snaps=[f"{ds}@snap-a", f"{ds}@snap-b"],
+            dst_snaps=[f"xeonpool/BACKUP/{ds}@snap-a"],
+        )
+        src_r[list_cmd(*datasets)] += s.pop(list_cmd(ds))
+        dst_r[list_cmd(*dst_datasets)] += d.pop(list_cmd(f"xeonpool/BACKUP/{ds}"))
+        src_r.update(s)
+    dst_r[resume_token_cmd(*dst_datasets)] = "".join(f"{d}\t-\n" for d in dst_datasets)
+    return src_r, dst_r
+
+
+def test_backup_parallel_sends_every_dataset(capsys):
+    """With max_parallel, all datasets are sent and each one's output stays together."""
+    datasets = [f"ipool/ds{i}" for i in range(4)]
+    src_r, dst_r = _parallel_responses(datasets)
+    src_exec = MockExecutor(src_r)
+    dst_exec = MockExecutor(dst_r)
+    config = _make_config(datasets)
+    config.max_parallel = 4
+
+    rc = run_backup(config, src_exec, dst_exec, dry_run=False, no_confirm=True)
+
+    assert rc == 0
+    assert src_exec.count_where("list") == dst_exec.count_where("list") == 1
+    assert dst_exec.count_where("get") == 1
+    assert src_exec.count_where("send") == len(datasets)
+    assert sorted(c[-1] for c in src_exec.calls_of("zfs", "send")) == [f"{ds}@snap-b" for ds in datasets]
+    out = capsys.readouterr().out
+    assert "4 dataset(s) sent" in out
+    blocks = out.split("=" * 60)
+    for ds in datasets:
+        block = next(b for b in blocks if f"Sending: {ds} ->" in b)
+        assert "Transfer complete." in block
+        assert block.count("Sending:") == 1
+
+
+def test_backup_parallel_keeps_output_when_a_worker_raises(capsys):
+    """An unexpected exception fails only its dataset; every other block is still printed."""
+    datasets = [f"ipool/ds{i}" for i in range(4)]
+    src_r, dst_r = _parallel_responses(datasets)
+    config = _make_config(datasets)
+    config.max_parallel = 4
+
+    def send_or_crash(**kwargs):
+        if kwargs["dst_dataset"] == "xeonpool/BACKUP/ipool/ds1":
+            print("  partial output before the crash")
+            raise RuntimeError("boom")
+        return send_incremental(**kwargs)
+
+    with patch("mzb.send_incremental", side_effect=send_or_crash):
+        rc = run_backup(config, MockExecutor(src_r), MockExecutor(dst_r), dry_run=False, no_confirm=True)
+
+    assert rc == 1
+    captured = capsys.readouterr()
+    assert "partial output before the crash" in captured.out
+    assert "ipool/ds1: unexpected RuntimeError: boom" in captured.err
+    assert captured.out.count("Transfer complete.") == len(datasets) - 1
+
+
+def test_backup_falls_back_to_per_dataset_resume_tokens(capsys):
+    """If the batched zfs get fails, only the dataset whose own get fails is an error."""
+    datasets = ["ipool/ds0", "ipool/ds1"]
+    src_r, dst_r = _parallel_responses(datasets)
+    dst_datasets = [f"xeonpool/BACKUP/{ds}" for ds in datasets]
+    dst_r[resume_token_cmd(*dst_datasets)] = ExecutorError(["zfs", "get"], 1, "does not exist")
+    dst_r[("zfs", "get", "-H", "-o", "value", "receive_resume_token", dst_datasets[0])] = "-\n"
+    dst_r[("zfs", "get", "-H", "-o", "value", "receive_resume_token", dst_datasets[1])] = (
+        ExecutorError(["zfs", "get"], 1, "dataset does not exist")
+    )
+
+    rc = run_backup(
+        _make_config(datasets), MockExecutor(src_r), MockExecutor(dst_r),
+        dry_run=True, no_confirm=True,
+    )
+
+    assert rc == 1
+    captured = capsys.readouterr()
+    assert "ipool/ds0: Send 1 snapshot(s)" in captured.out
+    assert "Could not read receive_resume_token" in captured.err
+
+
+def test_backup_falls_back_to_per_dataset_listing(capsys):
+    """If the batched listing fails (a dataset is missing), each dataset is listed on its own."""
+    other = "ipool/other"
+    src_r, dst_r = make_standard_responses()
+    src_r[list_cmd(SRC, other)] = ExecutorError(["zfs", "list"], 1, "permission denied")
+    src_r[list_cmd(other)] = other + "\n"
+    dst_r[list_cmd(DST, f"xeonpool/BACKUP/{other}")] = ExecutorError(["zfs", "list"], 1, "does not exist")
+    dst_r[list_cmd(f"xeonpool/BACKUP/{other}")] = ExecutorError(["zfs", "list"], 1, "does not exist")
+
+    rc = run_backup(
+        _make_config([SRC, other]), MockExecutor(src_r), MockExecutor(dst_r),
+        dry_run=True, no_confirm=True,
+    )
+
+    assert rc == 1  # other has no destination yet
+    captured = capsys.readouterr()
+    assert f"Destination dataset does not exist: xeonpool/BACKUP/{other}" in captured.err
+    assert f"{SRC}: Send" in captured.out
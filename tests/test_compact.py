@@ -8,18 +8,18 @@ import re
 
 
 from mzb import (
-    _snapshots_to_delete, run_compact,
+    _qualify_rule, _snapshots_to_delete, destroy_batches, run_compact,
     ExecutorError,
     DestinationConfig, JobConfig, RetentionRule, Snapshot, SourceConfig,
 )
-from tests.conftest import MockExecutor, _snap_list_output
+from tests.conftest import WILDCARD, MockExecutor, _snap_list_output, list_cmd
 
 DST = "xeonpool/BACKUP/ipool/home/user"
 
 
 def _qualified_rule(pattern: str, keep: int, dataset: str = DST) -> RetentionRule:
-    """Build a qualified rule matching full_name: dataset@pattern."""
-    return RetentionRule(pattern=re.escape(dataset) + "@" + pattern, keep=keep)
+    """Build the rule run_compact applies to dataset's snapshots."""
+    return _qualify_rule(RetentionRule(pattern=pattern, keep=keep), dataset)
 
 
 def _make_config(compaction):
@@ -101,9 +101,7 @@ def test_multiple_rules_no_duplicates():
 
 def _dst_responses(snaps: list[str]) -> dict:
     return {
-        ("zfs", "list", "-H", "-o", "name", DST): DST + "\n",
-        ("zfs", "list", "-H", "-o", "name", "-t", "snapshot", "-r", DST):
-            _snap_list_output(snaps),
+        list_cmd(DST): _snap_list_output([DST, *snaps]),
     }
 
 
@@ -120,7 +118,7 @@ def test_compact_dry_run_no_deletes(capsys):
     rc = run_compact(config, dst_exec, dry_run=True, no_confirm=True)
     assert rc == 0
     # No destroy commands should have been issued
-    assert not any("destroy" in str(c) for c in dst_exec.calls)
+    assert dst_exec.count_where("destroy") == 0
     captured = capsys.readouterr()
     assert "frequent" in captured.out
 
@@ -131,10 +129,9 @@ def test_compact_live_deletes():
         f"{DST}@zfs-auto-snap_frequent-2026-02-17-2215",
     ]
     responses = _dst_responses(dst_snaps)
-    # Add destroy responses
-    for snap in dst_snaps:
-        snap_name = snap.split("@")[1]
-        responses[("zfs", "destroy", f"{DST}@{snap_name}")] = ""
+    # Both snapshots go in one batched destroy
+    batched = f"{DST}@zfs-auto-snap_frequent-2026-02-17-2200,zfs-auto-snap_frequent-2026-02-17-2215"
+    responses[("zfs", "destroy", batched)] = ""
 
     dst_exec = MockExecutor(responses)
     config = _make_config([
@@ -142,8 +139,36 @@ def test_compact_live_deletes():
     ])
     rc = run_compact(config, dst_exec, dry_run=False, no_confirm=True)
     assert rc == 0
-    destroy_cmds = [c for c in dst_exec.calls if c[0:2] == ["zfs", "destroy"]]
-    assert len(destroy_cmds) == 2
+    assert dst_exec.calls_of("zfs", "destroy") == [["zfs", "destroy", batched]]
+
+
+def test_compact_batches_destroys_in_chunks(monkeypatch):
+    """Large delete sets are split into batches of DESTROY_BATCH_SIZE."""
+    monkeypatch.setattr("mzb.DESTROY_BATCH_SIZE", 2)
+    names = [f"zfs-auto-snap_frequent-2026-02-17-22{m:02d}" for m in range(0, 50, 10)]
+    responses = _dst_responses([f"{DST}@{n}" for n in names])
+    responses[("zfs", "destroy", WILDCARD)] = ""
+    dst_exec = MockExecutor(responses)
+    config = _make_config([
+        RetentionRule(pattern="zfs-auto-snap_frequent-.*", keep=0),
+    ])
+    rc = run_compact(config, dst_exec, dry_run=False, no_confirm=True)
+    assert rc == 0
+    assert [c[2] for c in dst_exec.calls_of("zfs", "destroy")] == [
+        f"{DST}@" + ",".join(names[start:start + 2]) for start in range(0, len(names), 2)
+    ]
+
+
+def test_compact_destroy_scripted_after_executor_created():
+    """Responses added to a MockExecutor after construction are answered too."""
+    dst_exec = MockExecutor(_dst_responses([f"{DST}@zfs-auto-snap_frequent-2026-02-17-2200"]))
+    dst_exec.responses[("zfs", "destroy", WILDCARD)] = ""
+    config = _make_config([
+        RetentionRule(pattern="zfs-auto-snap_frequent-.*", keep=0),
+    ])
+    rc = run_compact(config, dst_exec, dry_run=False, no_confirm=True)
+    assert rc == 0
+    assert dst_exec.count_where("destroy") == 1
 
 
 def test_compact_nothing_to_delete(capsys):
@@ -174,9 +199,7 @@ def test_compact_ignores_unconfigured_datasets():
     # run_compact must ignore those since it only compacts config.datasets (DST).
     all_snaps = configured_snaps + other_snaps
     responses = {
-        ("zfs", "list", "-H", "-o", "name", DST): DST + "\n",
-        ("zfs", "list", "-H", "-o", "name", "-t", "snapshot", "-r", DST):
-            _snap_list_output(all_snaps),
+        list_cmd(DST): _snap_list_output([DST, *all_snaps]),
         ("zfs", "destroy", f"{DST}@zfs-auto-snap_frequent-2026-02-17-2200"): "",
         # If we try to destroy other_dst snapshots, MockExecutor will KeyError the missing response.
     }
@@ -187,8 +210,7 @@ def test_compact_ignores_unconfigured_datasets():
     rc = run_compact(config, dst_exec, dry_run=False, no_confirm=True)
     assert rc == 0
 
-    destroy_cmds = [c for c in dst_exec.calls if c[0:2] == ["zfs", "destroy"]]
-    assert destroy_cmds == [
+    assert dst_exec.calls_of("zfs", "destroy") == [
         ["zfs", "destroy", f"{DST}@zfs-auto-snap_frequent-2026-02-17-2200"],
     ]
 
@@ -212,7 +234,11 @@ def test_compact_partial_destroy_failure(capsys):
         f"{DST}@zfs-auto-snap_frequent-2026-02-17-2215",
     ]
     responses = _dst_responses(dst_snaps)
-    # First destroy succeeds, second fails
+    # The batched destroy fails as a whole...
+    responses[("zfs", "destroy", f"{DST}@zfs-auto-snap_frequent-2026-02-17-2200,zfs-auto-snap_frequent-2026-02-17-2215")] = (
+        ExecutorError(["zfs", "destroy"], 1, "dataset is busy")
+    )
+    # ...then one-by-one, first destroy succeeds, second fails
     responses[("zfs", "destroy", f"{DST}@zfs-auto-snap_frequent-2026-02-17-2200")] = ""
     responses[("zfs", "destroy", f"{DST}@zfs-auto-snap_frequent-2026-02-17-2215")] = (
         ExecutorError(["zfs", "destroy"], 1, "dataset is busy")
@@ -223,6 +249,7 @@ def test_compact_partial_destroy_failure(capsys):
     ])
     rc = run_compact(config, dst_exec, dry_run=False, no_confirm=True)
     assert rc == 1
+    assert len(dst_exec.calls_of("zfs", "destroy")) == 3  # batch, then one by one
     captured = capsys.readouterr()
     assert "Deleted 1 of 2" in captured.out
     assert "ERROR" in captured.err
@@ -235,3 +262,80 @@ def test_compact_no_rules(capsys):
     assert rc == 0
     captured = capsys.readouterr()
     assert "No compaction rules" in captured.out
+
+
+def test_union_prefilter_keeps_rules_independent():
+    """The combined prefilter must not change which rules a snapshot counts toward."""
+    snaps = _make_snaps(["snap-a", "snap-b", "other-c"])
+    rules = [
+        _qualified_rule("snap-.*", keep=1),
+        _qualified_rule("snap-a", keep=0),
+    ]
+    to_delete = _snapshots_to_delete(snaps, rules)
+    assert [s.name for s in to_delete] == ["snap-a"]
+
+
+def test_retention_rule_compiles_pattern_once():
+    a = _qualified_rule("zfs-auto-snap_daily-.*", keep=1)
+    b = _qualified_rule("zfs-auto-snap_daily-.*", keep=5)
+    assert a.regex is b.regex
+    assert a == RetentionRule(pattern=a.pattern, keep=1)
+
+
+def test_destroy_batches_bounded_by_argument_length(monkeypatch):
+    """Long snapshot names split a batch before DESTROY_BATCH_SIZE is reached."""
+    monkeypatch.setattr("mzb.DESTROY_BATCH_BYTES", len(DST) + 1 + 2 * 11)
+    snaps = _make_snaps([f"snap-{i:05d}" for i in range(5)])  # 10 chars + ','
+    batches = destroy_batches(snaps)
+    assert [len(b) for b in batches] == [2, 2, 1]
+    assert [s for b in batches for s in b] == snaps
+
+
+def test_compact_alternation_pattern_stays_qualified():
+    """A top-level '|' in a configured pattern must apply after the dataset prefix."""
+    dst_snaps = [f"{DST}@hourly-1", f"{DST}@daily-1", f"{DST}@weekly-1"]
+    responses = _dst_responses(dst_snaps)
+    responses[("zfs", "destroy", f"{DST}@hourly-1,daily-1")] = ""
+    dst_exec = MockExecutor(responses)
+    config = _make_config([RetentionRule(pattern="hourly-.*|daily-.*", keep=0)])
+    rc = run_compact(config, dst_exec, dry_run=False, no_confirm=True)
+    assert rc == 0
+    assert dst_exec.calls_of("zfs", "destroy") == [["zfs", "destroy", f"{DST}@hourly-1,daily-1"]]
+
+
+def test_keep_n_follows_creation_order_not_names():
+    """'Newest' is position in zfs list output (creation order), never name order."""
+    snaps = _make_snaps(["weekly-zz-old", "weekly-aa-new"])  # oldest first
+    to_delete = _snapshots_to_delete(snaps, [_qualified_rule("weekly-.*", keep=1)])
+    assert [s.name for s in to_delete] == ["weekly-zz-old"]
+
+
+def test_rules_sharing_a_group_name_still_apply_independently():
+    """Group names that would collide in a combined regex must not break compaction."""
+    snaps = _make_snaps(["daily-1", "daily-2", "weekly-1", "weekly-2"])
+    rules = [
+        _qualified_rule("(?P<k>daily)-.*", keep=1),
+        _qualified_rule("(?P<k>weekly)-.*", keep=1),
+    ]
+    to_delete = _snapshots_to_delete(snaps, rules)
+    assert [s.name for s in to_delete] == ["daily-1", "weekly-1"]
+
+
+def test_numbered_backreference_keeps_its_meaning_alongside_other_rules():
+    snaps = _make_snaps(["aa", "ab"])
+    alone = [_qualified_rule("(a)\\1", keep=0)]
+    # In a combined regex, \1 would point at the earlier rule's group instead
+    combined = [_qualified_rule("(x)-.*", keep=0)] + alone
+    assert [s.name for s in _snapshots_to_delete(snaps, alone)] == ["aa"]
+    assert [s.name for s in _snapshots_to_delete(snaps, combined)] == ["aa"]
+
+
+def test_rules_that_only_compile_alone_fall_back_to_per_rule_matching():
+    """E.g. a global inline flag is only valid at the start of the whole regex."""
+    snaps = _make_snaps(["DAILY-1", "DAILY-2", "weekly-1"])
+    rules = [
+        RetentionRule(pattern="(?i)" + re.escape(DST) + "@daily-.*", keep=1),
+        _qualified_rule("weekly-.*", keep=0),
+    ]
+    to_delete = _snapshots_to_delete(snaps, rules)
+    assert [s.name for s in to_delete] == ["DAILY-1", "weekly-1"]
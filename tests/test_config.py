@@ -6,6 +6,7 @@ from __future__ import annotations
 import textwrap
 
 import pytest
+import yaml
 
 from mzb import ConfigError, load_job
 
@@ -35,6 +36,20 @@ class TestLoadJobValid:
         assert config.source.pool == "ipool"
         assert config.destination.pool == "xeonpool"
         assert config.datasets == ["ipool/home/user"]
+        assert config.destination.buffer_mb == 0
+        assert config.source.raw is False
+        assert config.source.large_blocks is False
+        assert config.max_parallel == 1
+
+    def test_raw_send(self, tmp_path):
+        path = _write_config(tmp_path, _minimal_yaml(source="source:\n  pool: ipool\n  raw: true"))
+        assert load_job(path).source.raw is True
+
+    def test_large_blocks(self, tmp_path):
+        path = _write_config(tmp_path, _minimal_yaml(source="source:\n  pool: ipool\n  large_blocks: true"))
+        config = load_job(path)
+        assert config.source.large_blocks is True
+        assert config.source.raw is False
 
     def test_with_compaction(self, tmp_path):
         path = _write_config(tmp_path, _minimal_yaml(
@@ -45,6 +60,13 @@ class TestLoadJobValid:
         assert config.compaction[0].keep == 7
 
 
+    def test_pure_python_yaml_fallback(self, tmp_path, monkeypatch):
+        """Without libyaml (no CSafeLoader), the pure-Python SafeLoader is used."""
+        monkeypatch.delattr(yaml, "CSafeLoader", raising=False)
+        config = load_job(_write_config(tmp_path, _minimal_yaml()))
+        assert config.datasets == ["ipool/home/user"]
+
+
 class TestLoadJobInvalid:
     def test_negative_keep(self, tmp_path):
         path = _write_config(tmp_path, _minimal_yaml(
@@ -81,6 +103,18 @@ class TestLoadJobInvalid:
         with pytest.raises(ConfigError, match="prefix must not be empty"):
             load_job(path)
 
+    def test_negative_buffer(self, tmp_path):
+        path = _write_config(tmp_path, _minimal_yaml(
+            destination="destination:\n  pool: xeonpool\n  buffer_mb: -1"
+        ))
+        with pytest.raises(ConfigError, match="buffer_mb must be >= 0"):
+            load_job(path)
+
+    def test_zero_max_parallel(self, tmp_path):
+        path = _write_config(tmp_path, _minimal_yaml() + "\nmax_parallel: 0")
+        with pytest.raises(ConfigError, match="max_parallel must be >= 1"):
+            load_job(path)
+
     def test_missing_source_pool(self, tmp_path):
         path = _write_config(tmp_path, _minimal_yaml(source="source:\n  pool:"))
         with pytest.raises(ConfigError, match="source.pool"):
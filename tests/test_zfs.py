@@ -3,16 +3,29 @@
 """Tests for ZFS operation functions in mzb."""
 from __future__ import annotations
 
+import fcntl
+import io
+import os
+import signal
+import subprocess
+import threading
+import time
+
+import pytest
+
 from mzb import (
-    Snapshot,
-    dataset_exists, find_common_snapshot, list_snapshots,
+    ExecutorError, LocalExecutor, SSHExecutor, Snapshot, _PIPE_SIZE, _buffered_copy, _grow_pipe,
+    find_common_indices, find_common_snapshot, list_snapshots, list_snapshots_if_exists,
+    discover_datasets, list_snapshots_of, snapshots_by_dataset, snapshots_by_dataset_both,
     send_incremental, destroy_snapshot,
 )
-from tests.conftest import DST_USER_SNAPS, MockExecutor, SRC_USER_SNAPS, make_standard_responses
+from tests.conftest import (
+    DST_USER_SNAPS, MockExecutor, SRC_USER_SNAPS, assert_contains_all, list_cmd,
+)
 
 
-def test_list_snapshots_basic():
-    src_responses, _ = make_standard_responses()
+def test_list_snapshots_basic(standard_responses):
+    src_responses, _ = standard_responses
     exec_ = MockExecutor(src_responses)
     snaps = list_snapshots("ipool/home/user", exec_)
     assert len(snaps) == len(SRC_USER_SNAPS)
@@ -23,14 +36,13 @@ def test_list_snapshots_basic():
 def test_list_snapshots_filters_children():
     """Snapshots from child datasets should not appear in parent's list."""
     output = (
+        "ipool/home/user\n"
         "ipool/home/user@snap-a\n"
-        "ipool/home/user/subdir@snap-b\n"  # child — should be excluded
         "ipool/home/user@snap-c\n"
+        "ipool/home/user/subdir\n"
+        "ipool/home/user/subdir@snap-b\n"  # child — should be excluded
     )
-    exec_ = MockExecutor({
-        ("zfs", "list", "-H", "-o", "name", "-t", "snapshot", "-r", "ipool/home/user"):
-            output,
-    })
+    exec_ = MockExecutor({list_cmd("ipool/home/user"): output})
     snaps = list_snapshots("ipool/home/user", exec_)
     assert len(snaps) == 2
     assert all(s.dataset == "ipool/home/user" for s in snaps)
@@ -67,26 +79,30 @@ def test_find_common_snapshot_returns_newest_common():
     assert common.name == "snap-2"
 
 
-def test_dataset_exists_true():
-    exec_ = MockExecutor({
-        ("zfs", "list", "-H", "-o", "name", "ipool/home/user"):
-            "ipool/home/user\n",
-    })
-    assert dataset_exists("ipool/home/user", exec_) is True
+def test_find_common_indices_positions_in_both_lists():
+    """Indices point at the common snapshot in each list even when they differ."""
+    src_snaps = [Snapshot.parse(f"ipool/ds@snap-{c}") for c in "abc"]
+    dst_snaps = [Snapshot.parse(f"pool2/ds@snap-{c}") for c in "adbe"]
+    assert find_common_indices(src_snaps, dst_snaps) == (1, 2)
+    assert find_common_indices(src_snaps, []) is None
+
 
+def test_find_common_indices_up_to_date_uses_both_tails():
+    src_snaps = [Snapshot.parse(f"ipool/ds@snap-{c}") for c in "abc"]
+    dst_snaps = [Snapshot.parse(f"pool2/ds@snap-{c}") for c in "xbc"]
+    assert find_common_indices(src_snaps, dst_snaps) == (2, 2)
 
-def test_dataset_exists_false():
-    from mzb import ExecutorError  # pylint: disable=import-outside-toplevel
 
+def test_list_snapshots_if_exists_missing_dataset():
     exec_ = MockExecutor({
-        ("zfs", "list", "-H", "-o", "name", "ipool/nonexistent"):
-            ExecutorError(["zfs", "list"], 1, "dataset does not exist"),
+        list_cmd("ipool/nonexistent"): ExecutorError(["zfs", "list"], 1, "dataset does not exist"),
     })
-    assert dataset_exists("ipool/nonexistent", exec_) is False
+    assert list_snapshots_if_exists("ipool/nonexistent", exec_) is None
+    assert len(exec_.calls) == 1
 
 
-def test_send_incremental_dry_run(capsys):
-    src_responses, _ = make_standard_responses()
+def test_send_incremental_dry_run(capsys, standard_responses):
+    src_responses, _ = standard_responses
     src_exec = MockExecutor(src_responses, is_verbose=False)
     dst_exec = MockExecutor({}, is_verbose=False)
 
@@ -104,10 +120,9 @@ def test_send_incremental_dry_run(capsys):
     )
 
     # No popen calls in dry-run mode
-    assert not any("popen" in str(c) for c in src_exec.calls)
+    assert src_exec.count_where("send") == 0
     captured = capsys.readouterr()
-    assert "zfs send" in captured.out
-    assert "zfs recv" in captured.out
+    assert_contains_all(captured.out, ["zfs send", "zfs recv"])
 
 
 def test_destroy_snapshot_dry_run(capsys):
@@ -118,3 +133,277 @@ def test_destroy_snapshot_dry_run(capsys):
     assert "zfs destroy" in captured.out
     # No actual run call
     assert not exec_.calls
+
+
+def test_send_incremental_live_pipes_send_into_recv():
+    src_exec = MockExecutor({})
+    dst_exec = MockExecutor({})
+
+    common = Snapshot.parse("ipool/home/user@backup10t-push-2025-11-11")
+    latest = Snapshot.parse("ipool/home/user@zfs-auto-snap_frequent-2026-02-17-2215")
+
+    send_incremental(
+        common=common,
+        latest=latest,
+        src_executor=src_exec,
+        dst_executor=dst_exec,
+        dst_dataset="xeonpool/BACKUP/ipool/home/user",
+    )
+
+    assert src_exec.calls == [["zfs", "send", "-c", "-I", common.full_name, latest.full_name]]
+    assert dst_exec.calls == [["zfs", "recv", "-s", "xeonpool/BACKUP/ipool/home/user"]]
+
+
+def test_buffered_copy_relays_stream_intact():
+    payload = os.urandom(3 * 1024 * 1024 + 123)
+    src_r, src_w = os.pipe()
+    dst_r, dst_w = os.pipe()
+    received = bytearray()
+
+    def produce():
+        with os.fdopen(src_w, "wb") as f:
+            f.write(payload)
+
+    def consume():
+        with os.fdopen(dst_r, "rb") as f:
+            received.extend(f.read())
+
+    threads = [threading.Thread(target=produce), threading.Thread(target=consume)]
+    for t in threads:
+        t.start()
+    _buffered_copy(src_r, dst_w, buffer_size=1024 * 1024)
+    os.close(dst_w)
+    os.close(src_r)
+    for t in threads:
+        t.join()
+    assert bytes(received) == payload
+
+
+def test_buffered_copy_stops_when_receiver_dies():
+    """If recv goes away mid-stream, the pump returns instead of hanging."""
+    src_r, src_w = os.pipe()
+    dst_r, dst_w = os.pipe()
+    os.close(dst_r)  # receiver is gone: writes raise BrokenPipeError
+
+    def produce():
+        try:
+            with os.fdopen(src_w, "wb") as f:
+                f.write(b"x" * (4 * 1024 * 1024))
+        except BrokenPipeError:
+            pass
+
+    producer = threading.Thread(target=produce)
+    producer.start()
+    _buffered_copy(src_r, dst_w, buffer_size=256 * 1024)
+    os.close(dst_w)
+    os.close(src_r)  # producer now sees SIGPIPE/EPIPE
+    producer.join(timeout=5)
+    assert not producer.is_alive()
+
+
+@pytest.mark.skipif(not hasattr(fcntl, "F_GETPIPE_SZ"), reason="Linux-only pipe sizing")
+def test_grow_pipe_enlarges_pipe_and_ignores_non_pipes():
+    read_fd, write_fd = os.pipe()
+    try:
+        before = fcntl.fcntl(read_fd, fcntl.F_GETPIPE_SZ)
+        with os.fdopen(read_fd, "rb", closefd=False) as stream:
+            _grow_pipe(stream)
+        # Grown, or left as it was where the kernel refuses (pipe-max-size)
+        assert fcntl.fcntl(read_fd, fcntl.F_GETPIPE_SZ) in (_PIPE_SIZE, before)
+    finally:
+        os.close(read_fd)
+        os.close(write_fd)
+    _grow_pipe(io.BytesIO(b""))  # no fileno (e.g. mocked streams): silently left alone
+
+
+def test_send_incremental_raw_uses_w_instead_of_c():
+    src_exec = MockExecutor({})
+    dst_exec = MockExecutor({})
+    common = Snapshot.parse("ipool/home/user@snap-a")
+    latest = Snapshot.parse("ipool/home/user@snap-b")
+
+    send_incremental(
+        common=common, latest=latest,
+        src_executor=src_exec, dst_executor=dst_exec,
+        dst_dataset="xeonpool/BACKUP/ipool/home/user", raw=True,
+    )
+
+    assert src_exec.calls == [["zfs", "send", "-w", "-I", common.full_name, latest.full_name]]
+
+
+def test_snapshot_parse_and_full_name():
+    snap = Snapshot.parse("ipool/ds@snap-a")
+    assert (snap.dataset, snap.name, snap.full_name) == ("ipool/ds", "snap-a", "ipool/ds@snap-a")
+    assert snap == Snapshot(dataset="ipool/ds", name="snap-a")
+    assert not hasattr(snap, "__dict__")
+
+
+def test_local_executor_run_decodes_output_and_errors():
+    exec_ = LocalExecutor()
+    assert exec_.run(["printf", "a@b\\nc\\n"]) == "a@b\nc\n"
+    with pytest.raises(ExecutorError, match="boom") as excinfo:
+        exec_.run(["sh", "-c", "echo boom >&2; exit 3"])
+    assert excinfo.value.returncode == 3
+
+
+def test_list_snapshots_of_buckets_requested_datasets():
+    # -d 1 also prints direct children (ipool/x/z); only requested datasets are kept
+    output = "ipool/x\nipool/x@b\nipool/x@c\nipool/x/z\nipool/y\n"
+    wanted = ["ipool/x", "ipool/y"]
+    listed = list_snapshots_of(wanted, MockExecutor({list_cmd(*wanted): output}))
+    assert {ds: [s.name for s in snaps] for ds, snaps in listed.items()} == {
+        "ipool/x": ["b", "c"], "ipool/y": [],
+    }
+
+
+def test_snapshots_by_dataset_both_lists_sides_concurrently():
+    """The source listing must not wait for the destination's to finish."""
+    both_running = threading.Barrier(2, timeout=5)
+
+    class _BlockingExecutor(MockExecutor):
+        def run(self, cmd):
+            both_running.wait()  # raises BrokenBarrierError if the sides run serially
+            return super().run(cmd)
+
+    src = _BlockingExecutor({list_cmd("ipool/a"): "ipool/a\nipool/a@s1\n"})
+    dst = _BlockingExecutor({list_cmd("pool2/a"): "pool2/a\n"})
+    src_listed, dst_listed = snapshots_by_dataset_both(["ipool/a"], src, ["pool2/a"], dst)
+    assert [s.name for s in src_listed["ipool/a"]] == ["s1"]
+    assert dst_listed == {"pool2/a": []}
+
+
+def test_discover_datasets_single_recursive_get():
+    exec_ = MockExecutor({
+        ("zfs", "get", "-H", "-r", "-t", "filesystem,volume", "-o", "name,value",
+         "com.sun:auto-snapshot", "ipool"):
+            "ipool\ttrue\nipool/home\ttrue\nipool/scratch\tfalse\nipool/vm\t-\n",
+    })
+    assert discover_datasets("ipool", exec_) == ["ipool/home"]
+    assert len(exec_.calls) == 1
+
+
+def test_local_executor_iter_lines_streams_and_raises():
+    exec_ = LocalExecutor()
+    assert list(exec_.iter_lines(["printf", "a\\nb\\n"])) == ["a\n", "b\n"]
+    lines = exec_.iter_lines(["sh", "-c", "echo partial; echo boom >&2; exit 2"])
+    assert next(lines) == "partial\n"
+    with pytest.raises(ExecutorError, match="boom"):
+        next(lines)
+
+
+# Stands in for ssh: logs its argv. A master (-N) creates its socket and
+# leaves a background child holding whatever stdio it inherited, as older
+# OpenSSH releases do; other invocations run their remote command locally.
+_FAKE_SSH = """#!/bin/sh
+printf '%s\\n' "$*" >> "$FAKE_SSH_LOG"
+case " $* " in
+  *" -O exit "*) exit 0 ;;
+  *" -N "*)
+    for arg; do case $arg in ControlPath=*) : > "${arg#ControlPath=}" ;; esac; done
+    sleep 30 & echo $! >> "$FAKE_SSH_PID"; exit 0 ;;
+esac
+for last; do :; done
+exec sh -c "$last"
+"""
+
+
+@pytest.fixture(name="fake_ssh")
+def _fake_ssh(tmp_path, monkeypatch):
+    script = tmp_path / "ssh"
+    script.write_text(_FAKE_SSH)
+    script.chmod(0o755)
+    log, pidfile = tmp_path / "ssh.log", tmp_path / "master.pid"
+    monkeypatch.setenv("PATH", f"{tmp_path}{os.pathsep}{os.environ['PATH']}")
+    monkeypatch.setenv("FAKE_SSH_LOG", str(log))
+    monkeypatch.setenv("FAKE_SSH_PID", str(pidfile))
+    yield log
+    if pidfile.exists():
+        for pid in pidfile.read_text().split():
+            os.kill(int(pid), signal.SIGTERM)
+
+
+def test_ssh_executor_starts_master_detached_and_multiplexes_commands(fake_ssh):
+    exec_ = SSHExecutor("backup.example", user="mzb")
+
+    started = time.monotonic()
+    assert exec_.run(["echo", "hello"]) == "hello\n"
+    assert list(exec_.iter_lines(["printf", "a\\nb\\n"])) == ["a\n", "b\n"]
+    # The master's background child must not hold the captured pipes open
+    assert time.monotonic() - started < 10
+    control_dir = exec_._control_dir  # pylint: disable=protected-access
+    exec_.close()
+
+    master, run_cmd, iter_cmd, exit_cmd = fake_ssh.read_text().splitlines()
+    assert "ControlMaster=yes" in master and "-N -f mzb@backup.example" in master
+    assert "ControlMaster=no" in run_cmd and "ControlMaster=no" in iter_cmd
+    assert exit_cmd.endswith("-O exit mzb@backup.example")
+    assert not os.path.exists(control_dir)
+
+
+def test_ssh_executor_restarts_an_expired_master(fake_ssh):
+    """Once ControlPersist expires (socket gone), the next short command starts a new master."""
+    exec_ = SSHExecutor("backup.example", user="mzb")
+    exec_.run(["true"])
+    exec_.run(["true"])
+    control_dir = exec_._control_dir  # pylint: disable=protected-access
+    for name in os.listdir(control_dir):
+        os.unlink(os.path.join(control_dir, name))
+    exec_.run(["true"])
+    exec_.close()
+    masters = [line for line in fake_ssh.read_text().splitlines() if " -N " in line]
+    assert len(masters) == 2
+
+
+@pytest.mark.usefixtures("fake_ssh")
+def test_ssh_executor_caps_concurrent_sessions(monkeypatch):
+    """More threads than SSH_MAX_SESSIONS wait for a session instead of exceeding sshd's limit."""
+    monkeypatch.setattr("mzb.SSH_MAX_SESSIONS", 2)
+    exec_ = SSHExecutor("backup.example", user="mzb")
+    lock = threading.Lock()
+    active, peak = [0], [0]
+
+    def fake_run_captured(_cmd):
+        with lock:
+            active[0] += 1
+            peak[0] = max(peak[0], active[0])
+        time.sleep(0.05)
+        with lock:
+            active[0] -= 1
+        return ""
+
+    monkeypatch.setattr("mzb._run_captured", fake_run_captured)
+    threads = [threading.Thread(target=exec_.run, args=(["true"],)) for _ in range(6)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    exec_.close()
+    assert peak[0] == 2
+
+
+def test_ssh_executor_streams_use_their_own_connection(fake_ssh):
+    exec_ = SSHExecutor("backup.example", user="mzb")
+    proc = exec_.popen(["echo", "stream"], stdout=subprocess.PIPE)
+    assert proc.communicate()[0] == b"stream\n"
+    assert "Control" not in fake_ssh.read_text()
+    assert exec_._control_dir is None  # pylint: disable=protected-access
+
+
+def test_snapshots_by_dataset_fallback_lists_concurrently():
+    """When the batched listing fails, datasets are listed on their own, in parallel."""
+    both_running = threading.Barrier(2, timeout=5)
+
+    class _BlockingExecutor(MockExecutor):
+        def run(self, cmd):
+            if len(cmd) == len(list_cmd("x")):  # per-dataset listings only
+                both_running.wait()  # raises BrokenBarrierError if listed one by one
+            return super().run(cmd)
+
+    exec_ = _BlockingExecutor({
+        list_cmd("ipool/a", "tank/b"): ExecutorError(["zfs", "list"], 1, "does not exist"),
+        list_cmd("ipool/a"): "ipool/a\nipool/a@s1\n",
+        list_cmd("tank/b"): ExecutorError(["zfs", "list"], 1, "does not exist"),
+    })
+    listed = snapshots_by_dataset(["ipool/a", "tank/b"], exec_)
+    assert [s.name for s in listed["ipool/a"]] == ["s1"]
+    assert listed["tank/b"] is None